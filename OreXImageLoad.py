@@ -1,11 +1,12 @@
 import os
-import hashlib
 import numpy as np
 import torch
 from PIL import Image, ImageSequence, ImageOps
 import folder_paths
 import node_helpers
 
+from .OreX_ImageIO import IMAGE_CACHE, draft_image, file_key, file_signature, fit_image, pil_to_tensor
+
 class OreXImageLoad:
     @classmethod
     def INPUT_TYPES(s):
@@ -14,6 +15,11 @@ class OreXImageLoad:
         files = folder_paths.filter_files_content_types(files, ["image"])
         return {"required":
                     {"image": (sorted(files), {"image_upload": True})},
+                "optional": {
+                    # Уменьшение ещё при декодировании (JPEG draft / reduce): 0 — исходный размер
+                    "max_side": ("INT", {"default": 0, "min": 0, "max": 16384, "step": 8}),
+                    "max_megapixels": ("FLOAT", {"default": 0.0, "min": 0.0, "max": 256.0, "step": 0.1}),
+                },
                 }
 
     CATEGORY = "🤫OreX/Image"
@@ -22,14 +28,25 @@ class OreXImageLoad:
     RETURN_NAMES = ("image", "mask", "filename", "width", "height")
     FUNCTION = "load_image"
 
-    def load_image(self, image):
+    def load_image(self, image, max_side=0, max_megapixels=0.0):
         # image - это строка с именем файла из INPUT_TYPES
         image_path = folder_paths.get_annotated_filepath(image)
 
         # Извлечение имени файла без расширения
         filename, _ = os.path.splitext(os.path.basename(image_path))
 
+        # Декодированные кадры и маска берутся из общего кэша, пока файл на диске не изменился
+        output_image, output_mask, w, h = IMAGE_CACHE.cached(
+            file_key(image_path, "OreXImageLoad", max_side, max_megapixels),
+            lambda: self._decode(image_path, max_side, max_megapixels),
+        )
+        return (output_image, output_mask, filename, w, h)
+
+    @staticmethod
+    def _decode(image_path, max_side=0, max_megapixels=0.0):
         img = node_helpers.pillow(Image.open, image_path)
+        # Для JPEG задаёт DCT-масштаб до декодирования: большой снимок не распаковывается целиком
+        draft_image(img, "RGB", max_side, max_megapixels)
 
         output_images = []
         output_masks = []
@@ -45,7 +62,7 @@ class OreXImageLoad:
                 i = i.point(lambda p: p * (1 / 255))
             
             # Используем новое имя переменной, чтобы не перезаписывать аргумент `image`
-            rgb_image = i.convert("RGB")
+            rgb_image = fit_image(i.convert("RGB"), max_side, max_megapixels)
 
             if len(output_images) == 0:
                 w = rgb_image.size[0]
@@ -55,15 +72,14 @@ class OreXImageLoad:
                 continue
 
             # Конвертация в тензор
-            image_tensor = np.array(rgb_image).astype(np.float32) / 255.0
-            image_tensor = torch.from_numpy(image_tensor)[None,]
+            image_tensor = pil_to_tensor(rgb_image)
             
-            # Обработка маски
+            # Обработка маски (альфа уменьшается так же, как кадр)
             if 'A' in i.getbands():
-                mask = np.array(i.getchannel('A')).astype(np.float32) / 255.0
+                mask = np.array(fit_image(i.getchannel('A'), max_side, max_megapixels)).astype(np.float32) / 255.0
                 mask = 1. - torch.from_numpy(mask)
             elif i.mode == 'P' and 'transparency' in i.info:
-                mask = np.array(i.convert('RGBA').getchannel('A')).astype(np.float32) / 255.0
+                mask = np.array(fit_image(i.convert('RGBA').getchannel('A'), max_side, max_megapixels)).astype(np.float32) / 255.0
                 mask = 1. - torch.from_numpy(mask)
             else:
                 # ОПТИМИЗАЦИЯ: Создаем пустую маску реального разрешения вместо 64x64
@@ -79,19 +95,13 @@ class OreXImageLoad:
             output_image = output_images[0]
             output_mask = output_masks[0]
 
-        return (output_image, output_mask, filename, w, h)
+        return (output_image, output_mask, w, h)
 
     @classmethod
-    def IS_CHANGED(s, image):
+    def IS_CHANGED(s, image, **kwargs):
         image_path = folder_paths.get_annotated_filepath(image)
-        m = hashlib.sha256()
-        
-        # ОПТИМИЗАЦИЯ: Чтение по чанкам предотвращает нехватку RAM при больших файлах
-        with open(image_path, 'rb') as f:
-            while chunk := f.read(8192):
-                m.update(chunk)
-                
-        return m.digest().hex()
+        # ОПТИМИЗАЦИЯ: отпечаток по stat; файл целиком хэшируется, только если stat не позволяет отличить перезапись
+        return file_signature(image_path)
 
     @classmethod
     def VALIDATE_INPUTS(s, image):
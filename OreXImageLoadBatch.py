@@ -1,16 +1,19 @@
 import os
 import torch
-import numpy as np
-from PIL import Image, ImageOps
 from collections import defaultdict
 import folder_paths
 from pathlib import Path
 
+from .OreX_FolderIndex import list_images
+from .OreX_ImageIO import ImagePrefetcher, load_image_tensor
+
 class OreXImageLoadBatch:
     def __init__(self):
         self.current_indices = defaultdict(int)
         self.image_paths_cache = {}
         # Кэш времени изменения (dir_mtime_cache) удален, так как мы фиксируем список файлов навсегда для каждого label
+        # Следующие файлы incremental режима декодируются в фоне, пока работают остальные ноды
+        self.prefetcher = ImagePrefetcher()
 
     @classmethod
     def INPUT_TYPES(cls):
@@ -26,6 +29,11 @@ class OreXImageLoadBatch:
                 # --- Красивый цветной переключатель ---
                 "allow_rgba_output": ("BOOLEAN", {"default": False, "label_on": "🟢 ON", "label_off": "🔴 OFF"}),
             },
+            "optional": {
+                # Уменьшение ещё при декодировании (JPEG draft / reduce): 0 — исходный размер
+                "max_side": ("INT", {"default": 0, "min": 0, "max": 16384, "step": 8}),
+                "max_megapixels": ("FLOAT", {"default": 0.0, "min": 0.0, "max": 256.0, "step": 0.1}),
+            },
         }
 
     RETURN_TYPES = ("IMAGE", "STRING", "STRING", "INT", "INT")
@@ -50,7 +58,21 @@ class OreXImageLoadBatch:
         return os.path.normpath(path)
 
     def load_images_from_path(self, path, pattern):
-        """Загрузка изображений (без вложенных папок)"""
+        """Загрузка изображений (без вложенных папок) из постоянного индекса папки"""
+        # Маска с подкаталогом не ложится на индекс одной папки — обходим файловую систему как раньше
+        if '/' in pattern or os.sep in pattern:
+            return self._glob_images_from_path(path, pattern)
+
+        try:
+            # Маска и сортировка работают по индексу; папка лишь сверяется с ним одним проходом scandir
+            root = os.path.realpath(path)
+            return [os.path.join(root, name) for name in list_images(root, pattern)]
+        except Exception as e:
+            print(f"[OreX] Path search error: {str(e)}")
+            return []
+
+    def _glob_images_from_path(self, path, pattern):
+        """Прямой обход через glob"""
         allowed_extensions = {'.png', '.jpg', '.jpeg', '.webp', '.bmp', '.tiff', '.tif', '.gif'}
         
         if pattern == '*':
@@ -71,19 +93,11 @@ class OreXImageLoadBatch:
         
         return sorted(image_paths)
 
-    def _load_and_process_image(self, image_path):
-        """Вспомогательная функция для безопасной загрузки картинки"""
-        try:
-            with Image.open(image_path) as open_img:
-                image = ImageOps.exif_transpose(open_img)
-                image.load() # Выкачиваем в память
-            filename = os.path.splitext(os.path.basename(image_path))[0]
-            return image, filename
-        except Exception as e:
-            print(f"[OreX] Error loading image {image_path}: {str(e)}")
-            return None, None
+    def _load_and_process_image(self, image_path, mode="RGB", max_side=0, max_megapixels=0.0):
+        """Вспомогательная функция для безопасной загрузки картинки сразу в тензор"""
+        return load_image_tensor(image_path, mode, max_side, max_megapixels)
 
-    def get_image_by_id(self, image_paths, index):
+    def get_image_by_id(self, image_paths, index, mode="RGB", max_side=0, max_megapixels=0.0):
         if not image_paths or index < 0 or index >= len(image_paths):
             return None, None
         
@@ -92,9 +106,9 @@ class OreXImageLoadBatch:
             print(f"[OreX] ERROR: File vanished from disk: {image_path}")
             return None, None
             
-        return self._load_and_process_image(image_path)
+        return self._load_and_process_image(image_path, mode, max_side, max_megapixels)
 
-    def get_next_image(self, image_paths, label):
+    def get_next_image(self, image_paths, label, mode="RGB", max_side=0, max_megapixels=0.0):
         if not image_paths:
             return None, None, 0
         
@@ -113,22 +127,19 @@ class OreXImageLoadBatch:
         if not os.path.exists(image_path):
             return None, None, current_index
         
-        image, filename = self._load_and_process_image(image_path)
+        # Готовый тензор из фоновой очереди (или декодирование на месте, если файл не был запланирован)
+        image, filename = self.prefetcher.take(image_path, mode, max_side, max_megapixels)
         
         # Обновляем индекс для следующего вызова
         self.current_indices[label] = (current_index + 1) % len(image_paths)
+
+        # Список файлов label зафиксирован — следующие файлы можно декодировать заранее
+        count = min(self.prefetcher.depth, len(image_paths) - 1)
+        self.prefetcher.schedule([image_paths[(current_index + k) % len(image_paths)] for k in range(1, count + 1)], mode, max_side, max_megapixels)
         
         return image, filename, current_index
 
-    def pil2tensor(self, image):
-        """Конвертация (Стандарт ComfyUI)"""
-        image_np = np.array(image).astype(np.float32) / 255.0
-        image_tensor = torch.from_numpy(image_np)
-        if len(image_tensor.shape) == 3: # H, W, C
-            image_tensor = image_tensor.unsqueeze(0) # 1, H, W, C
-        return image_tensor
-
-    def load_batch_images(self, folder_path, file_pattern, start_index, seed, mode, label, allow_rgba_output):
+    def load_batch_images(self, folder_path, file_pattern, start_index, seed, mode, label, allow_rgba_output, max_side=0, max_megapixels=0.0):
         processed_path = self.sanitize_path(folder_path)
         
         if not os.path.exists(processed_path):
@@ -156,28 +167,22 @@ class OreXImageLoadBatch:
             start_index = 0
             print(f"[OreX] Warning: start_index out of range. Reset to 0.")
         
+        # ГАРАНТИЯ КОНСИСТЕНТНОСТИ КАНАЛОВ (Крайне важно для ComfyUI): режим задаётся ещё при декодировании
+        color_mode = 'RGBA' if allow_rgba_output else 'RGB'
+
         if mode == "single_image":
-            image, filename = self.get_image_by_id(image_paths, start_index)
+            image_tensor, filename = self.get_image_by_id(image_paths, start_index, color_mode, max_side, max_megapixels)
             current_index = start_index
         elif mode == "incremental_image":
             if label not in self.current_indices:
                 self.current_indices[label] = start_index
-            image, filename, current_index = self.get_next_image(image_paths, label)
+            image_tensor, filename, current_index = self.get_next_image(image_paths, label, color_mode, max_side, max_megapixels)
         else:
             return (torch.zeros((1, 64, 64, 3)), "", processed_path, total_count, 0)
         
-        if image is None:
+        if image_tensor is None:
             return (torch.zeros((1, 64, 64, 3)), "", processed_path, total_count, current_index)
         
-        # ГАРАНТИЯ КОНСИСТЕНТНОСТИ КАНАЛОВ (Крайне важно для ComfyUI)
-        if allow_rgba_output:
-            if image.mode != 'RGBA':
-                image = image.convert('RGBA')
-        else:
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-        
-        image_tensor = self.pil2tensor(image)
         return (image_tensor, filename, processed_path, total_count, current_index)
 
 NODE_CLASS_MAPPINGS = {
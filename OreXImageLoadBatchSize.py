@@ -1,10 +1,10 @@
 import os
 import torch
-import numpy as np
-from PIL import Image, ImageOps
-import fnmatch
 import re
 
+from .OreX_FolderIndex import list_images
+from .OreX_ImageIO import load_image_tensors
+
 # Функция для естественной сортировки (1, 2, 10, а не 1, 10, 2)
 def natural_sort_key(s):
     return [int(text) if text.isdigit() else text.lower() for text in re.split(r'(\d+)', s)]
@@ -27,7 +27,12 @@ class OreXImageLoadBatchSize:
                 # Убраны label_on и label_off, так как базовый парсер ComfyUI может из-за них упасть
                 "file_name_without_extension": ("BOOLEAN", {"default": True}),
                 "seed": ("INT", {"default": 0, "min": 0, "max": 0xffffffffffffffff})
-            }
+            },
+            "optional": {
+                # Уменьшение ещё при декодировании (JPEG draft / reduce): 0 — исходный размер
+                "max_side": ("INT", {"default": 0, "min": 0, "max": 16384, "step": 8}),
+                "max_megapixels": ("FLOAT", {"default": 0.0, "min": 0.0, "max": 256.0, "step": 0.1}),
+            },
         }
 
     RETURN_TYPES = ("IMAGE", "STRING", "STRING", "INT")
@@ -43,7 +48,7 @@ class OreXImageLoadBatchSize:
         return str(kwargs.get('seed', 0))
 
     # Добавлен параметр label и **kwargs чтобы поглотить seed и скрытые системные параметры, если они прилетят
-    def load_batch(self, folder_path, file_pattern, batch_size, start_index, label, file_name_without_extension, **kwargs):
+    def load_batch(self, folder_path, file_pattern, batch_size, start_index, label, file_name_without_extension, max_side=0, max_megapixels=0.0, **kwargs):
         
         # Функция-помощник для возврата пустого результата, чтобы не дублировать код
         def empty_result():
@@ -63,16 +68,10 @@ class OreXImageLoadBatchSize:
             image_extensions = {'.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tiff', '.tif'} # Использование множества (set) быстрее для поиска
             
             try:
-                # os.listdir по умолчанию НЕ читает вложенные папки
-                all_files = os.listdir(folder_path)
-                # Фильтрация файлов
-                valid_files = [
-                    f for f in all_files
-                    if (os.path.splitext(f)[1].lower() in image_extensions and 
-                        fnmatch.fnmatch(f.lower(), file_pattern.lower()))
-                ]
-                # ЕСТЕСТВЕННАЯ сортировка (исправляет баг, когда 10.png идет перед 2.png)
-                file_list = sorted(valid_files, key=natural_sort_key)
+                # Постоянный индекс папки (без вложенных): папка сверяется с ним одним проходом scandir,
+                # фильтр (регистронезависимый fnmatch) и ЕСТЕСТВЕННАЯ сортировка идут по индексу
+                indexed_files = list_images(folder_path, file_pattern, ignore_case=True, sort_key=natural_sort_key)
+                file_list = [f for f in indexed_files if os.path.splitext(f)[1].lower() in image_extensions]
                 
                 # Замораживаем список
                 self.file_list_cache[cache_key] = file_list
@@ -96,31 +95,26 @@ class OreXImageLoadBatchSize:
         end_index = min(start_index + batch_size, total_files)
         selected_files = file_list[start_index:end_index]
 
-        images = []
-        filenames = []
-        
+        present_files = []
         for filename in selected_files:
             file_path = os.path.join(folder_path, filename)
             if not os.path.exists(file_path):
                 print(f"[OreX Batch] Предупреждение: Файл пропал с диска: {file_path}")
                 continue
-                
-            try:
-                # Безопасное чтение PIL без утечек дескрипторов файлов
-                with Image.open(file_path) as open_img:
-                    img = ImageOps.exif_transpose(open_img).convert("RGB")
-                    # Нет необходимости вызывать img.load() внутри with, 
-                    # так как мы сразу конвертируем его в numpy массив ниже.
-                
-                img_array = np.array(img).astype(np.float32) / 255.0
-                img_tensor = torch.from_numpy(img_array).unsqueeze(0)
-                
-                images.append(img_tensor)
-                name = os.path.splitext(filename)[0] if file_name_without_extension else filename
-                filenames.append(name)
+            present_files.append(filename)
 
-            except Exception as e:
-                print(f"[OreX Batch Error] Ошибка загрузки {filename}: {str(e)}")
+        # Декодирование параллельно в пуле потоков (PIL отпускает GIL), каждый кадр сразу пишется
+        # в заранее выделенный float-тензор; порядок результатов совпадает с порядком файлов
+        decoded = load_image_tensors([os.path.join(folder_path, f) for f in present_files], "RGB", max_side, max_megapixels)
+
+        images = []
+        filenames = []
+        for filename, (img_tensor, _) in zip(present_files, decoded):
+            if img_tensor is None:
+                continue
+            images.append(img_tensor)
+            name = os.path.splitext(filename)[0] if file_name_without_extension else filename
+            filenames.append(name)
 
         if not images:
             return empty_result()
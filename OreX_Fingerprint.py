@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Быстрые отпечатки содержимого IMAGE-тензоров для IS_CHANGED и кэшей."""
+import hashlib
+import math
+import os
+
+import torch
+
+# xxhash заметно быстрее blake2 на больших буферах, но это необязательная зависимость
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+# Сколько значений берём в выборку с шагом, когда полный хэш не нужен
+SAMPLE_COUNT = 65536
+# По умолчанию хэшируется выборка; OREX_FULL_HASH=1 включает полный хэш буфера (медленно на 4K-батчах без xxhash)
+FULL_HASH = os.environ.get("OREX_FULL_HASH", "0") == "1"
+
+
+def _new_hasher():
+    if xxhash is not None:
+        return xxhash.xxh3_128()
+    return hashlib.blake2b(digest_size=16)
+
+
+def tensor_fingerprint(tensor, full=None):
+    """Отпечаток тензора: форма, dtype и содержимое.
+
+    По умолчанию (full=None -> FULL_HASH) хэшируется равномерная выборка из SAMPLE_COUNT значений:
+    на 4K-батче это микросекунды вместо секунд. full=True хэширует весь буфер хранилища без копирования
+    (memoryview поверх numpy-представления CPU-тензора).
+    """
+    if full is None:
+        full = FULL_HASH
+    if tensor is None:
+        return "none"
+
+    m = _new_hasher()
+    m.update(f"{tuple(tensor.shape)}|{tensor.dtype}".encode())
+
+    flat = tensor.detach()
+    if not flat.is_contiguous():
+        flat = flat.contiguous()
+    flat = flat.reshape(-1)
+    numel = flat.numel()
+
+    if not full and numel > SAMPLE_COUNT:
+        step = numel // SAMPLE_COUNT
+        # Шаг, кратный числу каналов, брал бы только один канал — делаем его взаимно простым с последним измерением
+        channels = tensor.shape[-1] if tensor.dim() else 1
+        while math.gcd(step, channels) > 1:
+            step += 1
+        # Выборку делаем на исходном устройстве, на CPU переносим только её
+        flat = flat[::step].contiguous()
+
+    if flat.device.type != "cpu":
+        flat = flat.cpu()
+    if flat.dtype == torch.bfloat16:
+        # numpy не знает bfloat16 — хэшируем те же байты как int16
+        flat = flat.view(torch.int16)
+
+    # numpy-представление разделяет память с тензором, memoryview отдаёт сырые байты без копии
+    m.update(memoryview(flat.numpy()).cast("B"))
+    return m.hexdigest()
+
+
+def hash_node_inputs(kwargs, image_keys=("image",), full=None):
+    """Хэш для IS_CHANGED: строковые значения виджетов плюс отпечатки IMAGE-входов."""
+    m = hashlib.sha256()
+    for k, v in kwargs.items():
+        if k not in image_keys:
+            m.update(str(v).encode())
+    for k in image_keys:
+        if kwargs.get(k) is not None:
+            m.update(f"{k}:{tensor_fingerprint(kwargs[k], full=full)}".encode())
+    return m.hexdigest()
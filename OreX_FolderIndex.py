@@ -0,0 +1,154 @@
+"""Постоянный индекс папок с изображениями для batch-загрузчиков.
+
+Для каждой папки в sqlite хранятся имена, размеры и mtime файлов. Размеры кадров не индексируются:
+загрузчикам они не нужны до декодирования, а чтение заголовков 300k файлов на NAS стоило бы дороже
+самого скана. Повторное сканирование — один проход os.scandir со сверкой с индексом; фильтр по маске
+и сортировка идут по индексу, а не по файловой системе. Если папка не менялась (mtime каталога тот же),
+scandir не нужен вовсе.
+"""
+import fnmatch
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from .OreX_ImageIO import STAT_RACY_WINDOW
+
+try:
+    import folder_paths
+except ImportError:
+    folder_paths = None
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.webp', '.bmp', '.tiff', '.tif', '.gif'}
+
+
+def _index_dir():
+    path = os.environ.get("OREX_FOLDER_INDEX_DIR")
+    if path:
+        return path
+    if folder_paths is not None:
+        return os.path.join(folder_paths.get_user_directory(), "orex_folder_index")
+    return os.path.join(os.path.expanduser("~"), ".cache", "orex_folder_index")
+
+
+def match_names(names, pattern="*", ignore_case=False):
+    """fnmatch-фильтр; ignore_case=False — регистр как в файловой системе (os.path.normcase)."""
+    if pattern == "*":
+        return list(names)
+    if ignore_case:
+        regex = re.compile(fnmatch.translate(pattern.lower()))
+        return [name for name in names if regex.match(name.lower())]
+    return fnmatch.filter(names, pattern)
+
+
+class FolderIndex:
+    """Индекс одной папки (без вложенных) в отдельном sqlite файле, общий для всех нод процесса."""
+
+    def __init__(self, directory, index_dir=None):
+        self.directory = os.path.realpath(directory)
+        index_dir = index_dir or _index_dir()
+        digest = hashlib.sha1(self.directory.encode("utf-8", "surrogateescape")).hexdigest()[:16]
+        self.db_path = os.path.join(index_dir, f"{digest}.sqlite")
+        self._lock = threading.Lock()
+        self._names = None
+        self._dir_mtime = None
+
+    @contextmanager
+    def _connect(self):
+        """Соединение на одну операцию: транзакция фиксируется при выходе, соединение закрывается."""
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS files (name TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER)")
+                conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+                yield conn
+        finally:
+            conn.close()
+
+    def _scan(self):
+        """Один проход scandir: {имя: (размер, mtime_ns)} для файлов изображений."""
+        found = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if os.path.splitext(entry.name)[1].lower() not in IMAGE_EXTENSIONS:
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    st = entry.stat()
+                except OSError:
+                    continue
+                found[entry.name] = (st.st_size, st.st_mtime_ns)
+        return found
+
+    def refresh(self, force=False):
+        """Сверяет индекс с папкой и возвращает отсортированный список имён файлов изображений.
+
+        Новые и изменённые файлы дописываются, пропавшие удаляются; остальные строки не трогаются.
+        """
+        with self._lock:
+            dir_mtime = os.stat(self.directory).st_mtime_ns
+            if not force and self._names is not None and dir_mtime == self._dir_mtime:
+                return self._names
+            started = time.monotonic()
+            with self._connect() as conn:
+                stored_mtime = conn.execute("SELECT value FROM meta WHERE key = 'dir_mtime_ns'").fetchone()
+                if not force and stored_mtime is not None and stored_mtime[0] == str(dir_mtime):
+                    names = sorted(row[0] for row in conn.execute("SELECT name FROM files"))
+                    changed = 0
+                else:
+                    known = {name: (size, mtime) for name, size, mtime in conn.execute("SELECT name, size, mtime_ns FROM files")}
+                    found = self._scan()
+                    removed = [(name,) for name in known if name not in found]
+                    updated = [(name, size, mtime) for name, (size, mtime) in found.items() if known.get(name) != (size, mtime)]
+                    conn.executemany("DELETE FROM files WHERE name = ?", removed)
+                    conn.executemany("INSERT OR REPLACE INTO files (name, size, mtime_ns) VALUES (?, ?, ?)", updated)
+                    # mtime каталога, изменённого только что, ненадёжен (его разрешение — до 2 с): в следующий раз сканируем снова
+                    trusted = time.time_ns() - dir_mtime >= STAT_RACY_WINDOW * 1_000_000_000
+                    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dir_mtime_ns', ?)", (str(dir_mtime) if trusted else "",))
+                    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('directory', ?)", (self.directory,))
+                    names = sorted(found)
+                    changed = len(removed) + len(updated)
+                    if not trusted:
+                        dir_mtime = None
+            self._names, self._dir_mtime = names, dir_mtime
+            print(f"[OreX] Folder index {self.directory}: {len(names)} images, {changed} changed ({time.monotonic() - started:.2f}s)")
+            return names
+
+    def select(self, pattern="*", ignore_case=False, sort_key=None):
+        """Имена из индекса по fnmatch-маске, отсортированные по sort_key (по умолчанию — по имени)."""
+        names = match_names(self.refresh(), pattern, ignore_case)
+        return sorted(names, key=sort_key) if sort_key is not None else names
+
+
+_INDEXES = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def folder_index(directory):
+    """Общий для процесса индекс папки."""
+    key = os.path.realpath(directory)
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(key)
+        if index is None:
+            index = FolderIndex(key)
+            _INDEXES[key] = index
+        return index
+
+
+def list_images(directory, pattern="*", ignore_case=False, sort_key=None):
+    """Имена файлов изображений папки по маске через индекс.
+
+    Если индекс недоступен (ошибка sqlite, каталог индекса нельзя создать или он только для чтения) —
+    прямой проход scandir без индекса, как до его появления.
+    """
+    index = folder_index(directory)
+    try:
+        return index.select(pattern, ignore_case, sort_key)
+    except (sqlite3.Error, OSError) as e:
+        print(f"[OreX] Folder index unavailable ({e}), scanning {directory} directly")
+        return sorted(match_names(index._scan(), pattern, ignore_case), key=sort_key)
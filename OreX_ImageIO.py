@@ -0,0 +1,277 @@
+import hashlib
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+from PIL import Image, ImageOps
+
+# Сколько следующих файлов декодируется заранее в incremental режиме
+PREFETCH_DEPTH = int(os.environ.get("OREX_PREFETCH_DEPTH", "4"))
+# Потоки фонового декодирования (PIL и torch отпускают GIL на декодировании и копировании)
+PREFETCH_WORKERS = int(os.environ.get("OREX_PREFETCH_WORKERS", "2"))
+# Потоки параллельного декодирования списка файлов (OreXImageLoadBatchSize)
+DECODE_WORKERS = int(os.environ.get("OREX_DECODE_WORKERS", str(min(8, os.cpu_count() or 1))))
+
+# Бюджет общего кэша декодированных тензоров (МБ, 0 — выключить). Кэшируются только повторно читаемые файлы
+# (Load Image, single_image режим); последовательное чтение папки в кэш не пишет
+IMAGE_CACHE_MB = int(os.environ.get("OREX_IMAGE_CACHE_MB", "256"))
+# Файл, изменённый позже этого числа секунд назад, может быть перезаписан в ту же «секунду» mtime
+# (FAT — 2 с, часть сетевых ФС — 1 с): по stat его не отличить, поэтому такой файл хэшируется по содержимому
+STAT_RACY_WINDOW = 2.0
+
+_EXECUTORS = {}
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _executor(name="prefetch", workers=PREFETCH_WORKERS):
+    with _EXECUTOR_LOCK:
+        executor = _EXECUTORS.get(name)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix=f"orex-image-{name}")
+            _EXECUTORS[name] = executor
+        return executor
+
+
+def pil_to_tensor(image):
+    """PIL -> тензор 1xHxWxC float32 0..1 (стандарт ComfyUI).
+
+    Выходной буфер выделяется один раз, а перевод uint8 -> float и деление на 255 идут одним проходом
+    (np.divide с out=): вместо двух полноразмерных float-копий (astype, деление) — только uint8-буфер.
+    Буфер выделяет numpy, а не torch.empty: первое касание свежей памяти у numpy заметно дешевле.
+    """
+    # Массив поверх bytes из PIL только для чтения — он лишь источник, в тензор не передаётся
+    pixels = np.asarray(image)
+    if pixels.ndim == 2:
+        pixels = pixels[..., None]
+    out = np.empty((1,) + pixels.shape, dtype=np.float32)
+    np.divide(pixels, np.float32(255.0), out=out[0])
+    return torch.from_numpy(out)
+
+
+class DecodedImageCache:
+    """Общий для нод загрузки LRU-кэш декодированных тензоров с бюджетом в байтах.
+
+    Ключ включает путь, размер, mtime и параметры декодирования, поэтому изменённый файл не попадёт в кэш.
+    Тензоры отдаются без копирования, как и кэш выходов ComfyUI: ноды не должны менять входы на месте.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _nbytes(value):
+        items = value if isinstance(value, (tuple, list)) else (value,)
+        return sum(v.element_size() * v.nelement() for v in items if isinstance(v, torch.Tensor))
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = self._nbytes(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+    def cached(self, key, loader, store=True):
+        """Значение из кэша или loader(); None-результаты (ошибка чтения) не кэшируются.
+
+        store=False — только чтение: файл, который больше не понадобится, не вытесняет полезные записи.
+        """
+        if key is None or self.max_bytes <= 0:
+            return loader()
+        value = self.get(key)
+        if value is None:
+            value = loader()
+            if store and value is not None and not (isinstance(value, tuple) and value[0] is None):
+                self.put(key, value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses}
+
+
+IMAGE_CACHE = DecodedImageCache(IMAGE_CACHE_MB * 1024 * 1024)
+
+
+def file_signature(image_path):
+    """Быстрый отпечаток файла для IS_CHANGED: размер, mtime и inode из stat.
+
+    Только если файл изменён совсем недавно и stat неоднозначен (перезапись в пределах разрешения mtime),
+    содержимое хэшируется целиком.
+    """
+    st = os.stat(image_path)
+    signature = f"{st.st_size}:{st.st_mtime_ns}:{st.st_ino}"
+    if time.time() - st.st_mtime >= STAT_RACY_WINDOW:
+        return signature
+    m = hashlib.sha256()
+    # Чтение по чанкам предотвращает нехватку RAM при больших файлах
+    with open(image_path, 'rb') as f:
+        while chunk := f.read(1 << 20):
+            m.update(chunk)
+    return f"{signature}:{m.hexdigest()}"
+
+
+def reduce_scale(width, height, max_side=0, max_megapixels=0.0):
+    """Масштаб, при котором кадр укладывается в max_side и max_megapixels (0 — без ограничения); 1.0 — уменьшать не нужно."""
+    scale = 1.0
+    if max_side and max_side > 0:
+        scale = min(scale, max_side / max(width, height))
+    if max_megapixels and max_megapixels > 0:
+        scale = min(scale, math.sqrt(max_megapixels * 1_000_000 / (width * height)))
+    return scale
+
+
+def _target_size(image, max_side, max_megapixels):
+    scale = reduce_scale(image.width, image.height, max_side, max_megapixels)
+    if scale >= 1.0:
+        return None
+    return max(1, int(image.width * scale)), max(1, int(image.height * scale))
+
+
+def draft_image(image, mode, max_side=0, max_megapixels=0.0):
+    """До декодирования: JPEG сразу декодируется с DCT-масштабом 1/2..1/8, не меньше нужного размера.
+
+    Вызывается на только что открытом файле; для остальных форматов ничего не делает.
+    """
+    target = _target_size(image, max_side, max_megapixels)
+    if target is not None and image.format == "JPEG":
+        image.draft(mode, target)
+    return image
+
+
+def fit_image(image, max_side=0, max_megapixels=0.0):
+    """После декодирования: reduce() на целый коэффициент (дешёвое усреднение блоков), затем точная подгонка LANCZOS."""
+    target = _target_size(image, max_side, max_megapixels)
+    if target is None:
+        return image
+    factor = min(image.width // target[0], image.height // target[1])
+    if factor >= 2 and image.mode not in ("1", "P"):
+        image = image.reduce(factor)
+    if image.size != target:
+        image = image.resize(target, Image.LANCZOS)
+    return image
+
+
+def load_image_tensor(image_path, mode="RGB", max_side=0, max_megapixels=0.0, cache=True):
+    """Открывает файл, применяет EXIF-поворот, приводит к mode и переводит в тензор. Возвращает (тензор, имя без расширения).
+
+    max_side / max_megapixels ограничивают размер кадра ещё при декодировании (0 — исходный размер).
+    Результат берётся из общего кэша IMAGE_CACHE, пока файл не изменился; cache=False — кэш только читается
+    (последовательный проход по папке читает каждый файл один раз).
+    """
+    return IMAGE_CACHE.cached(
+        file_key(image_path, mode, max_side, max_megapixels),
+        lambda: _decode_image(image_path, mode, max_side, max_megapixels),
+        store=cache,
+    )
+
+
+def _decode_image(image_path, mode, max_side=0, max_megapixels=0.0):
+    try:
+        with Image.open(image_path) as open_img:
+            draft_image(open_img, mode, max_side, max_megapixels)
+            image = ImageOps.exif_transpose(open_img)
+            if image.mode != mode:
+                image = image.convert(mode)
+            else:
+                image.load()  # Выкачиваем в память, пока файл открыт
+        image = fit_image(image, max_side, max_megapixels)
+        filename = os.path.splitext(os.path.basename(image_path))[0]
+        return pil_to_tensor(image), filename
+    except Exception as e:
+        print(f"[OreX] Error loading image {image_path}: {str(e)}")
+        return None, None
+
+
+def load_image_tensors(image_paths, mode="RGB", max_side=0, max_megapixels=0.0, cache=False):
+    """Параллельное декодирование списка файлов; порядок результатов совпадает с порядком путей.
+
+    Срезы папки читаются по одному разу, поэтому по умолчанию в кэш не пишутся.
+    """
+    def load(path):
+        return load_image_tensor(path, mode, max_side, max_megapixels, cache)
+    if len(image_paths) <= 1:
+        return [load(path) for path in image_paths]
+    return list(_executor("decode", DECODE_WORKERS).map(load, image_paths))
+
+
+def file_key(image_path, *options):
+    # Ключ с mtime и размером: файл, перезаписанный после постановки в очередь, декодируется заново;
+    # options — параметры декодирования (режим, лимиты размера)
+    try:
+        st = os.stat(image_path)
+    except OSError:
+        return None
+    return (image_path, st.st_mtime_ns, st.st_size) + options
+
+
+class ImagePrefetcher:
+    """Ограниченная очередь заранее декодированных изображений для последовательного чтения папки.
+
+    schedule() держит в работе только окно следующих файлов, take() забирает готовый тензор
+    или, если файл не был запланирован, декодирует его сразу.
+    """
+
+    def __init__(self, depth=PREFETCH_DEPTH):
+        self.depth = max(0, depth)
+        self._ready = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, image_path, mode="RGB", max_side=0, max_megapixels=0.0):
+        key = file_key(image_path, mode, max_side, max_megapixels)
+        with self._lock:
+            future = self._ready.pop(key, None) if key is not None else None
+        if future is not None and not future.cancelled():
+            return future.result()
+        return load_image_tensor(image_path, mode, max_side, max_megapixels, cache=False)
+
+    def schedule(self, image_paths, mode="RGB", max_side=0, max_megapixels=0.0):
+        """Ставит в фоновое декодирование следующие файлы; всё, что вне окна, отменяется и освобождается."""
+        wanted = []
+        for path in image_paths[:self.depth]:
+            key = file_key(path, mode, max_side, max_megapixels)
+            if key is not None and key not in wanted:
+                wanted.append(key)
+        with self._lock:
+            for key in [k for k in self._ready if k not in wanted]:
+                self._ready.pop(key).cancel()
+            for key in wanted:
+                # Уже декодированное лежит в общем кэше — фоновая задача не нужна
+                if key not in self._ready and key not in IMAGE_CACHE:
+                    self._ready[key] = _executor().submit(load_image_tensor, key[0], mode, max_side, max_megapixels, cache=False)
+
+    def clear(self):
+        with self._lock:
+            for future in self._ready.values():
+                future.cancel()
+            self._ready.clear()
@@ -0,0 +1,842 @@
+# -*- coding: utf-8 -*-
+"""Общий слой LLM нод: бэкенды (OpenAI-совместимый / Ollama), очередь запросов к хосту и базовая нода.
+
+OreXLMStudio и OreXOllama — тонкие надстройки над LLMNodeBase. Чтобы подключить другой
+OpenAI-совместимый сервер, достаточно создать OpenAICompatibleBackend со своей переменной
+окружения и унаследовать ноду от LLMNodeBase с этим BACKEND: по умолчанию параметры генерации
+передаются стандартными полями OpenAI, а выгрузка модели ничего не делает (памятью управляет сервер).
+"""
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+
+from .OreX_Fingerprint import hash_node_inputs
+from .OreX_LLMCache import RESPONSE_CACHE, make_cache_key
+from .OreX_LLMClient import (
+    LLMConnectionError,
+    LLMHTTPError,
+    StreamReporter,
+    check_connection,
+    iter_stream_lines,
+    request_json,
+    resolve_host,
+)
+from .OreX_LLMModels import register_catalog
+from .OreX_LLMPresets import PRESETS
+from .OreX_LLMReasoning import strip_reasoning
+from .OreX_LLMResidency import RESIDENCY
+from .OreX_LLMTelemetry import TELEMETRY
+from .OreX_LLMSession import SESSION_TYPE, LLMSession
+from .OreX_LLMStructured import STRUCTURED_FIELD_OUTPUTS, extract_json, field_names, field_text, parse_schema, validate
+from .OreX_VisionEncode import encode_region, tile_plan
+
+try:
+    import comfy.model_management as mm
+except ImportError:
+    mm = None
+
+DEFAULT_LLM = "SELECT A MODEL"
+
+# Сколько запросов одновременно уходит на один хост и сколько может ждать в очереди
+MAX_IN_FLIGHT_PER_HOST = int(os.environ.get("OREX_LLM_MAX_INFLIGHT", "4"))
+MAX_QUEUED_PER_HOST = int(os.environ.get("OREX_LLM_MAX_QUEUE", "256"))
+
+# Режимы плиток для крупных изображений и пояснения к ним для модели
+TILING_MODES = ["off", "single request", "parallel merge"]
+TILE_SINGLE_NOTE = "The first image shows the whole picture; the next {count} images are overlapping high-resolution crops of it, row by row from the top left."
+TILE_PARALLEL_NOTE = "This image is a high-resolution crop ({label}) of a larger picture; describe only what is visible in it."
+
+
+def clean_reasoning_content(content):
+    """Безопасная очистка скрытых размышлений моделей класса DeepSeek R1 (один проход, см. OreX_LLMReasoning)."""
+    return strip_reasoning(content)
+
+
+def prefill_log(prompt_tokens=None, prefill_s=None, cached_tokens=None, source="server"):
+    """Запись о prefill (обработке промпта) для лога запроса: по ней видно, переиспользовал ли сервер KV-кэш префикса."""
+    log = {"prompt_tokens": prompt_tokens, "cached_tokens": cached_tokens, "prefill_s": prefill_s}
+    log = {k: v for k, v in log.items() if v is not None}
+    if "prefill_s" in log:
+        log["prefill_s"] = round(log["prefill_s"], 3)
+        log["source"] = source
+    return log
+
+
+def usage_log(prompt_tokens=None, completion_tokens=None, eval_tokens_per_s=None):
+    """Токены и скорость генерации по данным сервера (usage, eval_count/eval_duration, timings)."""
+    log = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "eval_tokens_per_s": eval_tokens_per_s}
+    return {k: (round(v, 2) if isinstance(v, float) else v) for k, v in log.items() if v is not None}
+
+
+def telemetry_record(backend_name, model, request_log):
+    """Запись телеметрии одного запроса из его лога: токены, TTFT, полная задержка, скорость генерации, кодирование кадра."""
+    usage = request_log.get("usage") or {}
+    return {
+        "backend": backend_name, "model": model,
+        "cache": request_log.get("cache"), "error": request_log.get("error"),
+        "prompt_tokens": usage.get("prompt_tokens"), "completion_tokens": usage.get("completion_tokens"),
+        "ttft_s": (request_log.get("stream_stats") or {}).get("time_to_first_token_s"),
+        "latency_s": request_log.get("latency_s"),
+        "eval_tokens_per_s": usage.get("eval_tokens_per_s"),
+        "encode_s": request_log.get("encode_s"),
+    }
+
+
+def as_bool(value):
+    return value if isinstance(value, bool) else str(value).upper() in ["TRUE", "ON"]
+
+
+def check_interrupted():
+    if mm is not None:
+        mm.throw_exception_if_processing_interrupted()
+
+
+def is_interrupt(e):
+    return mm is not None and isinstance(e, mm.InterruptProcessingException)
+
+
+# --- ОЧЕРЕДЬ ЗАПРОСОВ К ХОСТУ ---
+
+class LLMQueueFull(Exception):
+    pass
+
+
+class HostLimiter:
+    """Ограничивает число одновременных запросов к хосту.
+
+    Ожидающие запросы сгруппированы по владельцу (ноде); слот по кругу отдаётся следующему
+    владельцу, поэтому batch одной ноды не блокирует другие LLM ноды того же графа.
+    """
+
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT_PER_HOST, max_queued=MAX_QUEUED_PER_HOST):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queued = max(1, max_queued)
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._queued = 0
+        self._waiting = OrderedDict()  # owner -> deque билетов, порядок ключей = порядок обхода
+
+    def _is_next(self, ticket):
+        for tickets in self._waiting.values():
+            return tickets[0] is ticket
+        return False
+
+    def _remove(self, owner, ticket, rotate=False):
+        tickets = self._waiting[owner]
+        tickets.remove(ticket)
+        self._queued -= 1
+        if not tickets:
+            del self._waiting[owner]
+        elif rotate:
+            self._waiting.move_to_end(owner)
+
+    def acquire(self, owner=None):
+        ticket = object()
+        with self._cond:
+            if self._queued >= self.max_queued:
+                raise LLMQueueFull(f"LLM request queue is full ({self.max_queued} waiting)")
+            self._waiting.setdefault(owner, deque()).append(ticket)
+            self._queued += 1
+            try:
+                while not (self._in_flight < self.max_in_flight and self._is_next(ticket)):
+                    self._cond.wait(0.5)
+                    check_interrupted()
+            except BaseException:
+                self._remove(owner, ticket)
+                self._cond.notify_all()
+                raise
+            self._remove(owner, ticket, rotate=True)
+            self._in_flight += 1
+            # Слот ещё есть — будим новый первый билет сразу, а не через таймаут wait
+            if self._in_flight < self.max_in_flight:
+                self._cond.notify_all()
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, owner=None):
+        self.acquire(owner)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        with self._cond:
+            return {"in_flight": self._in_flight, "queued": self._queued, "max_in_flight": self.max_in_flight}
+
+
+_LIMITERS = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_limiter(base_url):
+    with _LIMITERS_LOCK:
+        limiter = _LIMITERS.get(base_url)
+        if limiter is None:
+            limiter = HostLimiter()
+            _LIMITERS[base_url] = limiter
+        return limiter
+
+
+# --- БЭКЕНДЫ ---
+
+class LLMBackend:
+    """Транспорт и формат запросов одного вида LLM сервера."""
+
+    name = ""
+    label = ""
+    # Поля payload, не влияющие на ответ модели (не входят в ключ кэша)
+    cache_exclude_keys = ()
+
+    def __init__(self, host_env, default_host):
+        self.host_env = host_env
+        self.default_host = default_host
+        self._catalog = None
+
+    def base_url(self):
+        return resolve_host(self.host_env, self.default_host)
+
+    def headers(self):
+        return None
+
+    @property
+    def catalog(self):
+        if self._catalog is None:
+            self._catalog = register_catalog(self.name, self.fetch_models)
+        return self._catalog
+
+    def request_json(self, method, path, payload=None, timeout=30.0):
+        try:
+            return request_json(self.base_url(), method, path, payload, timeout, self.headers())
+        except (LLMHTTPError, LLMConnectionError) as e:
+            raise Exception(self.format_error(e))
+
+    def format_error(self, e):
+        return str(e)
+
+    def check_connection(self):
+        pass
+
+    def fetch_models(self):
+        raise NotImplementedError
+
+    def load_model(self, model_key):
+        """Загрузка модели в память сервера заранее (упреждающая загрузка из фонового потока)."""
+        raise NotImplementedError
+
+    def unload_model(self, model_key):
+        """Выгрузка модели из памяти сервера; вызывается менеджером резидентности из фонового потока."""
+        raise NotImplementedError
+
+    def build_payload(self, model_key, system_prompt, user_text, encoded, options, history=()):
+        """encoded — EncodedImage, список EncodedImage (режим плиток) или None.
+        history — прошлые ходы сессии: (role, текст, JPEG base64 или None), идут между system и новым сообщением."""
+        raise NotImplementedError
+
+    @staticmethod
+    def images(encoded):
+        if encoded is None:
+            return []
+        return list(encoded) if isinstance(encoded, (list, tuple)) else [encoded]
+
+    def apply_schema(self, payload, schema):
+        """Ограничивает генерацию JSON по схеме средствами сервера."""
+        raise NotImplementedError
+
+    def complete(self, payload, timeout):
+        """Возвращает (content, reasoning, stats)."""
+        raise NotImplementedError
+
+    def stream(self, payload, timeout, stream_id=None, hide_reasoning=False):
+        """Возвращает (content, reasoning, stats)."""
+        raise NotImplementedError
+
+    def cache_key(self, payload):
+        return make_cache_key(self.base_url(), {k: v for k, v in payload.items() if k not in self.cache_exclude_keys})
+
+    def chat(self, payload, timeout, stream=False, stream_id=None, owner=None, hide_reasoning=False):
+        """Генерация через очередь хоста: не больше MAX_IN_FLIGHT_PER_HOST запросов одновременно."""
+        with get_limiter(self.base_url()).slot(owner):
+            try:
+                if stream:
+                    return self.stream(payload, timeout, stream_id, hide_reasoning)
+                return self.complete(payload, timeout)
+            except (LLMHTTPError, LLMConnectionError) as e:
+                raise Exception(self.format_error(e))
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """Любой сервер с /v1/chat/completions и /v1/models (LM Studio, llama.cpp server, vLLM и т.д.)."""
+
+    def __init__(self, name, host_env, default_host, label=None, api_key_env=None, cache_prompt=False):
+        super().__init__(host_env, default_host)
+        self.name = name
+        self.label = label or name
+        self.api_key_env = api_key_env
+        # cache_prompt — флаг llama.cpp (движок LM Studio) на переиспользование KV-кэша общего префикса;
+        # по умолчанию выключен: OpenAI API и строгие совместимые серверы отвечают 400 на неизвестное поле
+        self.cache_prompt = cache_prompt
+        self.cache_exclude_keys = ("cache_prompt",)
+
+    def headers(self):
+        api_key = os.environ.get(self.api_key_env, "") if self.api_key_env else ""
+        return {"Authorization": f"Bearer {api_key}"} if api_key else None
+
+    def format_error(self, e):
+        return f"{self.label} API request failed: {e}"
+
+    def check_connection(self):
+        # Результат проверки кэшируется в общем клиенте, поэтому в очереди пробник /v1/models не шлётся перед каждой генерацией
+        try:
+            check_connection(self.base_url(), "/v1/models", timeout=3.0, headers=self.headers())
+        except Exception as e:
+            raise Exception(f"Cannot connect to {self.label}. Make sure the server is running at {self.base_url()}. (Error: {e})")
+
+    def fetch_models(self):
+        # Фоновое обновление списка заодно служит периодической пробой хоста для circuit breaker
+        models = []
+        data = request_json(self.base_url(), "GET", "/v1/models", timeout=4.0, headers=self.headers(), retries=0)
+        for m in data.get("data", []):
+            m_id = m.get("id")
+            if m_id and m_id not in models:
+                models.append(m_id)
+        return models
+
+    def build_payload(self, model_key, system_prompt, user_text, encoded, options, history=()):
+        payload = {"model": model_key, "messages": [], "stream": False}
+        payload.update(options)
+        if self.cache_prompt:
+            payload["cache_prompt"] = True
+
+        # Порядок от самого стабильного к самому изменчивому: system, текст пользователя, картинка.
+        # Тогда в batch и между заданиями очереди общий префикс промпта совпадает и сервер берёт его из KV-кэша
+        if system_prompt:
+            payload["messages"].append({"role": "system", "content": system_prompt})
+        for role, text, image_b64 in history:
+            payload["messages"].append(self._message(role, text, [f"data:image/jpeg;base64,{image_b64}"] if image_b64 else []))
+        payload["messages"].append(self._message("user", user_text, [e.data_url for e in self.images(encoded)]))
+        return payload
+
+    @staticmethod
+    def _message(role, text, image_urls):
+        if not image_urls:
+            return {"role": role, "content": text}
+        content_list = []
+        if text and text.strip():
+            content_list.append({"type": "text", "text": text})
+        # Несколько изображений (обзор и плитки) — несколько image_url в одном сообщении
+        content_list.extend({"type": "image_url", "image_url": {"url": url}} for url in image_urls)
+        return {"role": role, "content": content_list}
+
+    def load_model(self, model_key):
+        # Отдельного эндпоинта загрузки в OpenAI-совместимом API нет: JIT-загрузку запускает запрос на один токен
+        payload = {"model": model_key, "messages": [{"role": "user", "content": " "}], "max_tokens": 1, "stream": False}
+        self.request_json("POST", "/v1/chat/completions", payload, timeout=600)
+
+    def unload_model(self, model_key):
+        # В OpenAI-совместимом API выгрузки нет: памятью управляет сервер (у LM Studio своя выгрузка в OreX_LMStudio)
+        pass
+
+    def apply_schema(self, payload, schema):
+        payload["response_format"] = {"type": "json_schema", "json_schema": {"name": "orex_output", "strict": True, "schema": schema}}
+
+    @staticmethod
+    def _prefill_stats(chunk, fallback_s=None):
+        usage = chunk.get("usage") or {}
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+        # timings.prompt_ms отдаёт llama.cpp server; иначе prefill оцениваем по time-to-first-token
+        prompt_ms = (chunk.get("timings") or {}).get("prompt_ms")
+        if prompt_ms is not None:
+            return prefill_log(usage.get("prompt_tokens"), prompt_ms / 1000.0, cached)
+        return prefill_log(usage.get("prompt_tokens"), fallback_s, cached, source="ttft")
+
+    @staticmethod
+    def _usage_stats(chunk, fallback_rate=None):
+        usage = chunk.get("usage") or {}
+        # predicted_per_second — скорость генерации по данным llama.cpp server
+        rate = (chunk.get("timings") or {}).get("predicted_per_second", fallback_rate)
+        return usage_log(usage.get("prompt_tokens"), usage.get("completion_tokens"), rate)
+
+    def complete(self, payload, timeout):
+        result = request_json(self.base_url(), "POST", "/v1/chat/completions", payload, timeout, self.headers())
+        message = result.get("choices", [{}])[0].get("message", {})
+        extra = {"prefill": self._prefill_stats(result), "usage": self._usage_stats(result)}
+        return message.get("content") or "", message.get("reasoning_content") or "", extra
+
+    def stream(self, payload, timeout, stream_id=None, hide_reasoning=False):
+        payload = dict(payload, stream=True, stream_options={"include_usage": True})
+        reporter = StreamReporter(stream_id, hide_reasoning)
+        usage_tokens = None
+        last_stats = {}
+        lines = iter_stream_lines(self.base_url(), "/v1/chat/completions", payload, timeout, self.headers())
+        with closing(lines):
+            for line in lines:
+                reporter.check_interrupted()
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    continue
+                chunk = json.loads(data)
+                if chunk.get("error"):
+                    raise Exception(chunk["error"])
+                if chunk.get("usage"):
+                    usage_tokens = chunk["usage"].get("completion_tokens")
+                    last_stats["usage"] = chunk["usage"]
+                if chunk.get("timings"):
+                    last_stats["timings"] = chunk["timings"]
+                for choice in chunk.get("choices") or []:
+                    delta = choice.get("delta") or {}
+                    reporter.add(delta.get("reasoning_content"), reasoning=True)
+                    reporter.add(delta.get("content"))
+        reporter.finish(usage_tokens)
+        stats = reporter.stats()
+        extra = {
+            "stream_stats": stats,
+            "prefill": self._prefill_stats(last_stats, stats["time_to_first_token_s"]),
+            "usage": self._usage_stats(last_stats, stats["tokens_per_second"] or None),
+        }
+        return reporter.content, reporter.reasoning, extra
+
+
+class OllamaBackend(LLMBackend):
+    name = "ollama"
+    label = "Ollama"
+    cache_exclude_keys = ("keep_alive",)
+
+    def format_error(self, e):
+        if isinstance(e, LLMHTTPError):
+            try:
+                error_data = json.loads(e.body)
+                error_msg = error_data.get("error", str(error_data))
+            except Exception:
+                error_msg = e.body
+            return f"HTTP Error {e.code}: {error_msg}"
+        return f"Connection failed: {e}"
+
+    def fetch_models(self):
+        models = []
+        data = request_json(self.base_url(), "GET", "/api/tags", timeout=1.5, retries=0)
+        for m in data.get("models", []):
+            m_id = m.get("name")
+            if m_id and m_id not in models:
+                models.append(m_id)
+        return models
+
+    def build_payload(self, model_key, system_prompt, user_text, encoded, options, history=()):
+        payload = {"model": model_key, "messages": [], "stream": False, "options": options}
+
+        # /api/chat не принимает context (он только у /api/generate): Ollama сама переиспользует KV-кэш
+        # совпадающего префикса, пока модель загружена (keep_alive) и options (num_ctx) не меняются.
+        # Поэтому порядок стабильный: system, история сессии, текст пользователя, а картинка — последней частью сообщения.
+        # Так в многоходовом диалоге заново считается только новое сообщение
+        if system_prompt:
+            payload["messages"].append({"role": "system", "content": system_prompt})
+        for role, text, image_b64 in history:
+            message = {"role": role, "content": text}
+            if image_b64:
+                message["images"] = [image_b64]
+            payload["messages"].append(message)
+
+        images = self.images(encoded)
+        has_text = user_text is not None and user_text.strip() != ""
+        fallback_text = "Describe this image in detail." if images else " "
+        user_msg = {"role": "user", "content": user_text.strip() if has_text else fallback_text}
+        if images:
+            user_msg["images"] = [e.b64 for e in images]
+        payload["messages"].append(user_msg)
+        return payload
+
+    def apply_schema(self, payload, schema):
+        payload["format"] = schema
+
+    @staticmethod
+    def _server_stats(result):
+        # Ollama сам сообщает время загрузки модели и prefill (нс); prompt_eval_count без уже закэшированного префикса
+        stats = {}
+        load_duration = result.get("load_duration")
+        if load_duration:
+            stats["load_duration_s"] = round(load_duration / 1e9, 3)
+        prompt_eval = result.get("prompt_eval_duration")
+        stats["prefill"] = prefill_log(result.get("prompt_eval_count"), prompt_eval / 1e9 if prompt_eval is not None else None)
+        eval_count, eval_duration = result.get("eval_count"), result.get("eval_duration")
+        rate = eval_count / (eval_duration / 1e9) if eval_count and eval_duration else None
+        stats["usage"] = usage_log(result.get("prompt_eval_count"), eval_count, rate)
+        return stats
+
+    def load_model(self, model_key):
+        # /api/generate без prompt только загружает модель; keep_alive не задаём — выгрузкой управляет менеджер резидентности
+        self.request_json("POST", "/api/generate", {"model": model_key}, timeout=600)
+
+    def unload_model(self, model_key):
+        self.request_json("POST", "/api/generate", {"model": model_key, "keep_alive": 0}, timeout=5)
+
+    def complete(self, payload, timeout):
+        result = request_json(self.base_url(), "POST", "/api/chat", payload, timeout)
+        message = result.get("message", {})
+        return message.get("content") or "", message.get("thinking") or "", self._server_stats(result)
+
+    def stream(self, payload, timeout, stream_id=None, hide_reasoning=False):
+        payload = dict(payload, stream=True)
+        reporter = StreamReporter(stream_id, hide_reasoning)
+        eval_count = None
+        server_stats = {}
+        with closing(iter_stream_lines(self.base_url(), "/api/chat", payload, timeout)) as lines:
+            for line in lines:
+                reporter.check_interrupted()
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise Exception(chunk["error"])
+                message = chunk.get("message") or {}
+                reporter.add(message.get("thinking"), reasoning=True)
+                reporter.add(message.get("content"))
+                if chunk.get("done"):
+                    eval_count = chunk.get("eval_count")
+                    server_stats = self._server_stats(chunk)
+        reporter.finish(eval_count)
+        return reporter.content, reporter.reasoning, dict(server_stats, stream_stats=reporter.stats())
+
+
+BACKENDS = {}
+
+
+def register_backend(backend):
+    BACKENDS[backend.name] = backend
+    # Запускаем фоновое обнаружение моделей сразу, чтобы к первому /object_info список уже был готов
+    backend.catalog
+    return backend
+
+
+LMSTUDIO_BACKEND = register_backend(OpenAICompatibleBackend("lmstudio", "LMSTUDIO_URL", "http://127.0.0.1:1234", label="LM Studio", cache_prompt=True))
+OLLAMA_BACKEND = register_backend(OllamaBackend("OLLAMA_URL", "http://127.0.0.1:11434"))
+
+
+# --- БАЗОВАЯ LLM НОДА ---
+
+class LLMNodeBase:
+    """Общий process_input для LLM нод. Подклассы задают BACKEND и переопределяют хуки."""
+
+    BACKEND = None
+    LOG_PREFIX = "[OreX LLM]"
+    ERROR_PREFIX = "LLM error"
+    TIMEOUT_SECONDS = 300
+
+    # Generated Text, Request, Generated Texts, затем JSON и поля структурированного вывода, телеметрия Stats и Session
+    RETURN_TYPES = ("STRING", "STRING", "STRING") + ("STRING",) * (1 + STRUCTURED_FIELD_OUTPUTS) + ("STRING", SESSION_TYPE)
+    OUTPUT_IS_LIST = (False, False, True) + (False,) * (1 + STRUCTURED_FIELD_OUTPUTS) + (False, False)
+    FUNCTION = "process_input"
+    CATEGORY = "🤫OreX/LLM"
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "text_input": ("STRING", {"multiline": True, "default": ""}),
+                "system_prompt": ("STRING", {"default": ""}),
+                "system_preset": (PRESETS.names(), ),
+                "model_key": (cls.BACKEND.catalog.choices(DEFAULT_LLM), ),
+                "include_reasoning": ("BOOLEAN", {"default": False, "label_on": "🟢 Thinking ON", "label_off": "🔴 Thinking OFF"}),
+                "auto_unload_model": ("BOOLEAN", {"default": True, "label_on": "🟢 Auto Unload ON", "label_off": "🔴 Auto Unload OFF"}),
+                "unload_delay": ("INT", {"default": 0, "min": 0, "max": 3600, "step": 1}),
+                "clean_vram_before": ("BOOLEAN", {"default": False, "label_on": "🟢 Clean VRAM ON", "label_off": "🔴 Clean VRAM OFF"}),
+                "seed": ("INT", {"default": 777, "min": 0, "max": 0xffffffffffffffff}),
+            },
+            "optional": {
+                "image": ("IMAGE",),
+                "context_length": ("INT", {"default": 4096, "min": 0, "max": 131072, "step": 256}),
+                "max_tokens": ("INT", {"default": 0, "min": 0, "max": 0xffffffffffffffff, "step": 256}),
+                "generation_parameters": ("BOOLEAN", {"default": False, "label_on": "🟢 ON", "label_off": "🔴 OFF"}),
+                "temperature": ("FLOAT", {"default": 0.7, "min": 0.0, "max": 2.0}),
+                "top_k": ("INT", {"default": 40, "min": 0, "max": 100}),
+                "top_p": ("FLOAT", {"default": 0.95, "min": 0.0, "max": 1.0, "step": 0.05}),
+                "repeat_penalty": ("FLOAT", {"default": 1.1, "min": 0.0, "max": 2.0, "step": 0.05}),
+                "stream_output": ("BOOLEAN", {"default": False, "label_on": "🟢 Stream ON", "label_off": "🔴 Stream OFF"}),
+                "use_cache": ("BOOLEAN", {"default": True, "label_on": "🟢 Cache ON", "label_off": "🔴 Cache OFF"}),
+                "batch_mode": ("BOOLEAN", {"default": False, "label_on": "🟢 Batch ON", "label_off": "🔴 Batch OFF"}),
+                "parallel_requests": ("INT", {"default": 2, "min": 1, "max": 16, "step": 1}),
+                "target_megapixels": ("FLOAT", {"default": 0.7, "min": 0.05, "max": 16.0, "step": 0.05}),
+                "jpeg_quality": ("INT", {"default": 75, "min": 10, "max": 100, "step": 1}),
+                "structured_output": ("BOOLEAN", {"default": False, "label_on": "🟢 JSON ON", "label_off": "🔴 JSON OFF"}),
+                "json_schema": ("STRING", {"multiline": True, "default": "caption, tags[]"}),
+                "session": (SESSION_TYPE,),
+                "tiling_mode": (TILING_MODES, {"default": "off"}),
+                "tile_budget_megapixels": ("FLOAT", {"default": 2.8, "min": 0.1, "max": 64.0, "step": 0.1}),
+            },
+            "hidden": {"unique_id": "UNIQUE_ID"},
+        }
+
+    @classmethod
+    def VALIDATE_INPUTS(cls, model_key):
+        # Список моделей обновляется в фоне, поэтому сохранённая в workflow модель может ещё не попасть в него —
+        # проверку по списку пропускаем, сам process_input сообщит о невыбранной модели
+        return True
+
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        # Отпечаток содержимого вместо image.mean(): разные картинки с одинаковым средним больше не дают устаревший результат
+        # Текст пресета тоже входит в отпечаток: после правки JSON нода перезапустится с тем же именем пресета
+        return hash_node_inputs(dict(kwargs, system_preset_text=PRESETS.get(kwargs.get("system_preset"))))
+
+    # --- хуки подклассов ---
+
+    def build_options(self, max_tokens, include_reasoning, seed, use_gen_params, context_length, temperature, top_k, top_p, repeat_penalty):
+        """Возвращает (options для payload, параметры для лога).
+
+        По умолчанию — стандартные поля OpenAI chat completions; top_k, repeat_penalty и context_length
+        в этом API не определены и не отправляются (подклассы передают их в формате своего сервера).
+        """
+        options = {"seed": seed}
+        if max_tokens > 0:
+            options["max_tokens"] = max_tokens
+        if use_gen_params:
+            options.update({"temperature": temperature, "top_p": top_p})
+        return options, dict(options, max_tokens=options.get("max_tokens", "Auto (Server Default)"))
+
+    def adjust_payload(self, payload, model_key, auto_unload, unload_delay):
+        """Добавляет в payload поля конкретного сервера (например keep_alive)."""
+
+    def unload_model(self, model_key):
+        self.BACKEND.unload_model(model_key)
+
+    def error_result(self, msg, log=None):
+        empty_outputs = ("",) * (1 + STRUCTURED_FIELD_OUTPUTS) + ("", None)
+        return (msg, json.dumps(log or {"error": msg}), []) + empty_outputs
+
+    # --- общий конвейер ---
+
+    def process_input(self, text_input, system_prompt, system_preset, model_key, include_reasoning, auto_unload_model, unload_delay, clean_vram_before, seed, image=None, context_length=4096, max_tokens=1024, generation_parameters=False, temperature=0.7, top_k=40, top_p=0.95, repeat_penalty=1.1, stream_output=False, use_cache=True, batch_mode=False, parallel_requests=2, target_megapixels=0.7, jpeg_quality=75, structured_output=False, json_schema="", session=None, tiling_mode="off", tile_budget_megapixels=2.8, unique_id=None):
+        backend = self.BACKEND
+
+        is_include_reasoning = as_bool(include_reasoning)
+        is_auto_unload = as_bool(auto_unload_model)
+        is_clean_vram = as_bool(clean_vram_before)
+        use_gen_params = as_bool(generation_parameters)
+        is_stream = as_bool(stream_output)
+        is_cache = as_bool(use_cache)
+        is_batch = as_bool(batch_mode)
+        is_structured = as_bool(structured_output)
+
+        # Очистка VRAM перед генерацией
+        if is_clean_vram and mm is not None:
+            print(f"{self.LOG_PREFIX} 🧹 Unloading ComfyUI models to free VRAM before {backend.label} inference...")
+            mm.unload_all_models()
+            mm.soft_empty_cache()
+
+        if model_key == DEFAULT_LLM or not model_key:
+            return self.error_result("Error: Please select a model from the list.", {"error": "No model selected"})
+
+        backend.check_connection()
+        has_image = image is not None
+        has_text = text_input is not None and text_input.strip() != ""
+
+        if not has_image and not has_text:
+            return self.error_result("No inputs provided.")
+
+        schema = None
+        if is_structured:
+            try:
+                schema = parse_schema(json_schema)
+            except ValueError as e:
+                return self.error_result(f"{self.ERROR_PREFIX}: {e}")
+
+        random.seed(seed)
+        preset_value = PRESETS.get(system_preset)
+        # Длинный пресет идёт первым: он общий для многих заданий очереди, и сервер переиспользует его KV-кэш
+        final_system_prompt = "\n".join(p for p in (preset_value.strip(), system_prompt.strip()) if p)
+
+        options, log_parameters = self.build_options(max_tokens, is_include_reasoning, seed, use_gen_params, context_length, temperature, top_k, top_p, repeat_penalty)
+        base_log = {
+            "model": model_key, "system_prompt": final_system_prompt,
+            "user_input": text_input if has_text else "[Empty/Image only]", "has_image": has_image,
+            "parameters": log_parameters
+        }
+        if schema is not None:
+            base_log["json_schema"] = schema
+        history = tuple(session.messages()) if session is not None else ()
+        if session is not None:
+            base_log["session"] = session.to_log()
+
+        # В batch-режиме подписываем каждый кадр IMAGE-батча, иначе только первый
+        frames = [None]
+        if has_image:
+            frames = [image[i] for i in range(image.shape[0])] if is_batch else [image[0]]
+
+        # Режим плиток: обзор кадра и перекрывающиеся плитки одним запросом или отдельными запросами с объединением ответов
+        tiling = tiling_mode if has_image else "off"
+        if tiling == "parallel merge" and schema is not None:
+            # JSON нескольких ответов не объединить — структурированный вывод получает все плитки одним запросом
+            tiling = "single request"
+        if tiling != "off":
+            base_log["tiling"] = {"mode": tiling, "budget_megapixels": tile_budget_megapixels}
+
+        # Задание — один запрос: (индекс кадра, кадр, [(подпись, прямоугольник или None)], пояснение к промпту)
+        jobs = []
+        for index, frame in enumerate(frames):
+            if frame is None:
+                jobs.append((index, None, [], ""))
+                continue
+            plan = tile_plan(frame.shape[0], frame.shape[1], target_megapixels, tile_budget_megapixels) if tiling != "off" else [("overview", None)]
+            if tiling == "parallel merge":
+                jobs.extend((index, frame, [region], TILE_PARALLEL_NOTE.format(label=region[0]) if region[1] is not None else "") for region in plan)
+            else:
+                jobs.append((index, frame, plan, TILE_SINGLE_NOTE.format(count=len(plan) - 1) if len(plan) > 1 else ""))
+
+        # Пока нода работает, менеджер резидентности не выгрузит модель; выгрузка — после простоя unload_delay
+        cold_start = RESIDENCY.begin(backend.name, model_key)
+        load_samples = []
+        # ComfyUI сбрасывает флаг прерывания при первой же проверке: увидит его только один поток,
+        # поэтому он поднимает общее событие, и остальные задания не отправляются на сервер
+        cancelled = threading.Event()
+
+        def run_one(job, stream_id):
+            """Один запрос задания. Возвращает (текст, лог, исключение прерывания, JSON-данные, JPEG-буферы)."""
+            _, frame, regions, note = job
+            request_log = dict(base_log, parameters=dict(base_log["parameters"]))
+            if cancelled.is_set():
+                request_log["error"] = "cancelled"
+                return "", request_log, None, None, None
+            try:
+                check_interrupted()
+                encoded = []
+                if regions:
+                    # Одни JPEG-буферы и для запроса, и для превью в логе
+                    encode_started = time.monotonic()
+                    encoded = [encode_region(frame, box, target_megapixels, jpeg_quality) for _, box in regions]
+                    request_log["encode_s"] = round(time.monotonic() - encode_started, 4)
+                    request_log["image_data"] = f"data:image/jpeg;base64,{encoded[0].preview}"
+                    if tiling != "off":
+                        request_log["tiles"] = [label for label, _ in regions]
+
+                user_text = text_input if has_text else ""
+                if note:
+                    user_text = f"{user_text}\n\n{note}" if user_text else note
+                payload = backend.build_payload(model_key, final_system_prompt, user_text, encoded or None, options, history)
+                self.adjust_payload(payload, model_key, is_auto_unload, unload_delay)
+                if schema is not None:
+                    backend.apply_schema(payload, schema)
+
+                # Идентичный запрос (модель, промпты, параметры, байты JPEG) отдаём из кэша без обращения к серверу
+                cache_key = backend.cache_key(payload) if is_cache else None
+                cached = RESPONSE_CACHE.get(cache_key) if cache_key else None
+                request_log["cache"] = "bypass" if cache_key is None else ("hit" if cached is not None else "miss")
+
+                if cached is not None:
+                    final_content = cached.get("content", "")
+                    reasoning_content = cached.get("reasoning_content", "")
+                else:
+                    started = time.monotonic()
+                    final_content, reasoning_content, extra_log = backend.chat(payload, self.TIMEOUT_SECONDS, stream=is_stream, stream_id=stream_id, owner=unique_id, hide_reasoning=not is_include_reasoning)
+                    request_log.update(extra_log)
+                    request_log["latency_s"] = round(time.monotonic() - started, 3)
+                    if cold_start:
+                        # Время загрузки, если сервер его сообщает, иначе полное время первого «холодного» запроса
+                        request_log["cold_start"] = True
+                        load_samples.append(extra_log.get("load_duration_s", time.monotonic() - started))
+                    if cache_key and (final_content or reasoning_content):
+                        RESPONSE_CACHE.put(cache_key, {"content": final_content, "reasoning_content": reasoning_content})
+
+                # Возвращаем размышления обратно в текст, если сервер их отделил на уровне API
+                if is_include_reasoning and reasoning_content:
+                    final_content = f"<think>\n{reasoning_content}\n</think>\n\n{final_content}"
+
+                if not is_include_reasoning:
+                    cleaned_content = clean_reasoning_content(final_content)
+                    # Если после удаления скрытых размышлений текст оказался пустым (например, сбой генерации)
+                    if not cleaned_content.strip() and final_content.strip():
+                        final_content = final_content + "\n\n[Внимание: модель сгенерировала только размышления без основного ответа]"
+                    else:
+                        final_content = cleaned_content
+
+                data = None
+                if schema is not None:
+                    # Один проход генерации: ответ только разбираем и проверяем, без повторных запросов
+                    try:
+                        data = extract_json(clean_reasoning_content(final_content))
+                        errors = validate(data, schema)
+                    except ValueError as e:
+                        errors = [str(e)]
+                    request_log["structured"] = {"valid": not errors, "errors": errors} if errors else {"valid": True}
+
+                return final_content, request_log, None, data, encoded
+
+            except Exception as e:
+                # Прерывание из ComfyUI не превращаем в текст ошибки — пробрасываем после выгрузки модели
+                if is_interrupt(e):
+                    cancelled.set()
+                    return "", request_log, e, None, None
+                request_log["error"] = str(e)
+                return f"{self.ERROR_PREFIX}: {str(e)}", request_log, None, None, None
+
+        workers = max(1, min(int(parallel_requests), len(jobs)))
+        results = []
+        try:
+            if workers == 1:
+                for job in jobs:
+                    results.append(run_one(job, unique_id))
+                    if results[-1][2] is not None:
+                        break
+            else:
+                # Сервер обслуживает параллельные слоты, HostLimiter ограничивает общее число запросов; map сохраняет порядок заданий
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    results = list(executor.map(lambda job: run_one(job, None), jobs))
+        finally:
+            # При ответе из кэша модель не загружалась — время простоя не сбрасываем
+            used = any(r[1].get("cache") != "hit" and "error" not in r[1] for r in results)
+            RESIDENCY.end(
+                backend.name, model_key, used,
+                idle_timeout=max(0, int(unload_delay)) if is_auto_unload else None,
+                unload_fn=self.unload_model,
+                load_latency=min(load_samples) if load_samples else None,
+            )
+
+        logs = [r[1] for r in results]
+
+        interrupted = next((r[2] for r in results if r[2] is not None), None)
+        if interrupted is not None:
+            raise interrupted
+
+        # Ответы на плитки одного кадра объединяются: сначала обзор, затем плитки с подписями
+        texts = []
+        for (index, _, regions, _), r in zip(jobs, results):
+            if index == len(texts):
+                texts.append(r[0])
+            else:
+                texts[index] += f"\n\n[{regions[0][0]}]\n{r[0]}"
+
+        stats = [telemetry_record(backend.name, model_key, log) for log in logs]
+        for record in stats:
+            TELEMETRY.record(record)
+
+        log_output = logs[0] if len(logs) == 1 else logs
+
+        json_text = ""
+        fields = [""] * STRUCTURED_FIELD_OUTPUTS
+        if schema is not None:
+            datas = [r[3] for r in results]
+            if any(d is not None for d in datas):
+                json_text = json.dumps(datas[0] if len(datas) == 1 else datas, ensure_ascii=False)
+            # Поля идут на выходы в порядке properties схемы; в batch значения кадров разделены пустой строкой
+            for i, name in enumerate(field_names(schema)[:STRUCTURED_FIELD_OUTPUTS]):
+                fields[i] = "\n\n".join(field_text(d.get(name)) if isinstance(d, dict) else "" for d in datas)
+
+        stats_text = json.dumps(stats[0] if len(stats) == 1 else stats, ensure_ascii=False)
+
+        # Сессия продолжается ответом на первый кадр (в batch остальные кадры — параллельные ветки того же хода);
+        # при ошибке ход не записывается. Размышления в историю не попадают
+        # (в истории остаётся только обзорный кадр — плитки нужны лишь для этого хода)
+        first_frame = [r for job, r in zip(jobs, results) if job[0] == 0]
+        next_session = session if session is not None else LLMSession()
+        if not any("error" in r[1] for r in first_frame):
+            encoded = first_frame[0][4]
+            next_session = next_session.append(text_input if has_text else "", encoded[0].b64 if encoded else None, clean_reasoning_content(texts[0]))
+
+        return ("\n\n".join(texts), json.dumps(log_output, indent=2, ensure_ascii=False), texts, json_text) + tuple(fields) + (stats_text, next_session)
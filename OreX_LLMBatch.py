@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""Пакетный прогон промптов из файла (txt / CSV / JSONL) через LLM сервер одной нодой, без задания очереди на каждый промпт.
+
+Результаты дописываются в JSONL по мере готовности; после сбоя повторный запуск пропускает уже готовые строки.
+"""
+import csv
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .OreX_Fingerprint import hash_node_inputs
+from .OreX_LLMBackend import BACKENDS, as_bool, check_interrupted, clean_reasoning_content, is_interrupt, telemetry_record
+from .OreX_LLMPresets import PRESETS
+from .OreX_LLMResidency import RESIDENCY
+from .OreX_LLMTelemetry import TELEMETRY
+from .OreX_LMStudio import OreXLMStudio
+from .OreX_Ollama import OreXOllama
+
+try:
+    import folder_paths
+except ImportError:
+    folder_paths = None
+
+try:
+    import comfy.utils
+except ImportError:
+    comfy = None
+
+# Ноды, чьи build_options / adjust_payload / unload_model задают формат запроса для каждого сервера
+BATCH_NODES = {"lmstudio": OreXLMStudio, "ollama": OreXOllama}
+
+# Сколько промптов читаем из файла впрок сверх числа параллельных запросов: файл не загружается в память целиком
+BATCH_READ_AHEAD = 2
+
+
+def resolve_path(path, base_dir):
+    path = os.path.expanduser(path.strip().strip('"'))
+    if not os.path.isabs(path) and base_dir:
+        path = os.path.join(base_dir, path)
+    return os.path.normpath(path)
+
+
+def iter_prompts(path, prompt_field="prompt"):
+    """Построчно отдаёт (номер записи, промпт, доп. поля). Формат — по расширению: .csv, .jsonl/.ndjson, иначе текст."""
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if ext == ".csv":
+            for index, row in enumerate(csv.DictReader(f)):
+                if prompt_field not in row:
+                    raise ValueError(f"CSV has no '{prompt_field}' column")
+                yield index, row.pop(prompt_field) or "", row
+        elif ext in (".jsonl", ".ndjson"):
+            index = 0
+            for line in f:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                if isinstance(item, dict):
+                    item = dict(item)
+                    yield index, str(item.pop(prompt_field, "")), item
+                else:
+                    yield index, str(item), {}
+                index += 1
+        else:
+            index = 0
+            for line in f:
+                if line.strip():
+                    yield index, line.rstrip("\r\n"), {}
+                    index += 1
+
+
+def completed_indices(path):
+    """Номера записей, для которых в выходном JSONL уже есть успешный результат.
+
+    Оборванная при сбое последняя строка не разбирается и просто пропускается.
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and "error" not in record and "index" in record:
+                done.add(record["index"])
+    return done
+
+
+class OreXLLMBatch:
+    """Прогоняет промпты из файла через выбранный сервер с ограниченным числом параллельных запросов."""
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "backend": (list(BATCH_NODES),),
+                "model_key": ("STRING", {"default": ""}),
+                "input_file": ("STRING", {"default": "prompts.txt"}),
+                "output_file": ("STRING", {"default": "llm_batch_results.jsonl"}),
+                "system_prompt": ("STRING", {"multiline": True, "default": ""}),
+                "system_preset": (PRESETS.names(), ),
+                "prompt_field": ("STRING", {"default": "prompt"}),
+                "concurrency": ("INT", {"default": 4, "min": 1, "max": 64, "step": 1}),
+                "resume": ("BOOLEAN", {"default": True, "label_on": "🟢 Resume ON", "label_off": "🔴 Resume OFF"}),
+                "include_reasoning": ("BOOLEAN", {"default": False, "label_on": "🟢 Thinking ON", "label_off": "🔴 Thinking OFF"}),
+                "seed": ("INT", {"default": 777, "min": 0, "max": 0xffffffffffffffff}),
+            },
+            "optional": {
+                "max_tokens": ("INT", {"default": 0, "min": 0, "max": 0xffffffffffffffff, "step": 256}),
+                "generation_parameters": ("BOOLEAN", {"default": False, "label_on": "🟢 ON", "label_off": "🔴 OFF"}),
+                "context_length": ("INT", {"default": 4096, "min": 0, "max": 131072, "step": 256}),
+                "temperature": ("FLOAT", {"default": 0.7, "min": 0.0, "max": 2.0}),
+                "top_k": ("INT", {"default": 40, "min": 0, "max": 100}),
+                "top_p": ("FLOAT", {"default": 0.95, "min": 0.0, "max": 1.0, "step": 0.05}),
+                "repeat_penalty": ("FLOAT", {"default": 1.1, "min": 0.0, "max": 2.0, "step": 0.05}),
+                "auto_unload_model": ("BOOLEAN", {"default": False, "label_on": "🟢 Auto Unload ON", "label_off": "🔴 Auto Unload OFF"}),
+                "unload_delay": ("INT", {"default": 0, "min": 0, "max": 3600, "step": 1}),
+            },
+            "hidden": {"unique_id": "UNIQUE_ID"},
+        }
+
+    RETURN_TYPES = ("STRING", "STRING")
+    RETURN_NAMES = ("Summary", "Output Path")
+    FUNCTION = "run_batch"
+    OUTPUT_NODE = True
+    CATEGORY = "🤫OreX/LLM"
+
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        # Перезапуск при изменении входного файла или выходного (например, его удалили ради полного прогона)
+        stats = {}
+        for key, base in (("input_file", cls._input_dir()), ("output_file", cls._output_dir())):
+            try:
+                st = os.stat(resolve_path(kwargs.get(key, ""), base))
+                stats[key] = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                stats[key] = None
+        return hash_node_inputs(dict(kwargs, file_stats=stats, system_preset_text=PRESETS.get(kwargs.get("system_preset"))))
+
+    @staticmethod
+    def _input_dir():
+        return folder_paths.get_input_directory() if folder_paths is not None else None
+
+    @staticmethod
+    def _output_dir():
+        return folder_paths.get_output_directory() if folder_paths is not None else None
+
+    def run_batch(self, backend, model_key, input_file, output_file, system_prompt, system_preset, prompt_field, concurrency, resume, include_reasoning, seed, max_tokens=0, generation_parameters=False, context_length=4096, temperature=0.7, top_k=40, top_p=0.95, repeat_penalty=1.1, auto_unload_model=False, unload_delay=0, unique_id=None):
+        node = BATCH_NODES[backend]()
+        llm = BACKENDS[backend]
+        is_include_reasoning = as_bool(include_reasoning)
+        is_auto_unload = as_bool(auto_unload_model)
+        model_key = model_key.strip()
+        if not model_key:
+            raise ValueError("model_key is empty: enter the model name as the server lists it")
+
+        input_path = resolve_path(input_file, self._input_dir())
+        output_path = resolve_path(output_file, self._output_dir())
+        if not os.path.isfile(input_path):
+            raise FileNotFoundError(f"Prompt file not found: {input_path}")
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+
+        llm.check_connection()
+        preset_value = PRESETS.get(system_preset)
+        final_system_prompt = "\n".join(p for p in (preset_value.strip(), system_prompt.strip()) if p)
+        options, log_parameters = node.build_options(max_tokens, is_include_reasoning, seed, as_bool(generation_parameters), context_length, temperature, top_k, top_p, repeat_penalty)
+
+        done = completed_indices(output_path) if as_bool(resume) else set()
+        if not as_bool(resume) and os.path.exists(output_path):
+            os.remove(output_path)
+        print(f"{node.LOG_PREFIX} 📚 Batch: {input_path} -> {output_path} ({len(done)} already done)")
+
+        def run_one(index, prompt, extra):
+            record = {"index": index, "prompt": prompt}
+            if extra:
+                record["fields"] = extra
+            request_log = {}
+            try:
+                payload = llm.build_payload(model_key, final_system_prompt, prompt, None, options)
+                node.adjust_payload(payload, model_key, is_auto_unload, unload_delay)
+                started = time.monotonic()
+                content, reasoning, request_log = llm.chat(payload, node.TIMEOUT_SECONDS, owner=unique_id)
+                request_log["latency_s"] = round(time.monotonic() - started, 3)
+                record["response"] = content if is_include_reasoning else clean_reasoning_content(content)
+                if is_include_reasoning and reasoning:
+                    record["reasoning"] = reasoning
+                record["usage"] = request_log.get("usage", {})
+                record["latency_s"] = request_log["latency_s"]
+            except Exception as e:
+                if is_interrupt(e):
+                    raise
+                record["error"] = request_log["error"] = str(e)
+            TELEMETRY.record(telemetry_record(llm.name, model_key, dict(request_log, cache="bypass")))
+            return record
+
+        counts = {"completed": 0, "errors": 0, "skipped": len(done)}
+        pbar = comfy.utils.ProgressBar(0) if comfy is not None else None
+        limit = max(1, int(concurrency))
+        started = time.monotonic()
+        RESIDENCY.begin(llm.name, model_key)
+        executor = ThreadPoolExecutor(max_workers=limit)
+        try:
+            # Дописываем построчно с flush: после сбоя в файле остаются все завершённые ответы
+            with open(output_path, "a", encoding="utf-8") as out:
+                if out.tell() > 0:
+                    with open(output_path, "rb") as f:
+                        f.seek(-1, os.SEEK_END)
+                        if f.read(1) != b"\n":
+                            out.write("\n")
+
+                in_flight = set()
+
+                def drain():
+                    nonlocal in_flight
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        record = future.result()
+                        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                        out.flush()
+                        counts["errors" if "error" in record else "completed"] += 1
+                    if pbar is not None:
+                        processed = counts["completed"] + counts["errors"]
+                        pbar.update_absolute(processed, processed + len(in_flight))
+
+                for index, prompt, extra in iter_prompts(input_path, prompt_field):
+                    if index in done:
+                        continue
+                    check_interrupted()
+                    while len(in_flight) >= limit * BATCH_READ_AHEAD:
+                        drain()
+                    in_flight.add(executor.submit(run_one, index, prompt, extra))
+                while in_flight:
+                    drain()
+        finally:
+            # При прерывании ещё не начатые запросы отменяем, начатые дожидаемся — их ответы догонит resume
+            executor.shutdown(wait=True, cancel_futures=True)
+            RESIDENCY.end(
+                llm.name, model_key, counts["completed"] > 0,
+                idle_timeout=max(0, int(unload_delay)) if is_auto_unload else None,
+                unload_fn=node.unload_model,
+            )
+
+        elapsed = time.monotonic() - started
+        summary = dict(counts, input=input_path, output=output_path, model=model_key, backend=llm.name,
+                       elapsed_s=round(elapsed, 1), prompts_per_s=round(counts["completed"] / elapsed, 2) if elapsed > 0 else None,
+                       parameters=log_parameters)
+        print(f"{node.LOG_PREFIX} ✅ Batch done: {counts['completed']} completed, {counts['errors']} errors, {counts['skipped']} skipped in {elapsed:.1f}s")
+        return (json.dumps(summary, indent=2, ensure_ascii=False), output_path)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""Дисковый кэш ответов LLM нод с LRU-вытеснением по суммарному размеру."""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+NODE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(NODE_DIR, "cache", "llm_responses")
+
+# Предел размера кэша на диске (МБ), можно переопределить переменной окружения
+CACHE_MAX_BYTES = int(float(os.environ.get("OREX_LLM_CACHE_MB", "256")) * 1024 * 1024)
+
+
+def make_cache_key(backend, payload):
+    """Ключ — хэш всего тела запроса (включая base64 JPEG), поэтому любое изменение входа даёт промах."""
+    m = hashlib.sha256()
+    m.update(backend.encode("utf-8"))
+    m.update(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    return m.hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._index = None  # key -> размер файла, от старых к новым
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _load_index(self):
+        # Порядок LRU восстанавливаем по mtime: при попадании файл "трогается" через os.utime
+        self._index = OrderedDict()
+        self._total = 0
+        if not os.path.isdir(self.directory):
+            return
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(".json"):
+                    st = entry.stat()
+                    entries.append((st.st_mtime, entry.name[:-5], st.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total += size
+
+    def get(self, key):
+        with self._lock:
+            if self._index is None:
+                self._load_index()
+            if key not in self._index:
+                return None
+            path = self._path(key)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    value = json.load(f)
+                os.utime(path, None)
+            except (OSError, json.JSONDecodeError):
+                self._total -= self._index.pop(key)
+                return None
+            self._index.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if self._index is None:
+                self._load_index()
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                tmp_path = self._path(key) + ".tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, self._path(key))
+            except OSError as e:
+                print(f"[OreX LLM Cache] Could not write cache entry: {e}")
+                return
+            self._total -= self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self._total += len(data)
+            self._evict()
+
+    def _evict(self):
+        while self._total > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+
+RESPONSE_CACHE = ResponseCache()
@@ -0,0 +1,479 @@
+# -*- coding: utf-8 -*-
+"""Общий HTTP-клиент для LLM нод (LM Studio / Ollama) с пулом keep-alive соединений."""
+import http.client
+import json
+import os
+import random
+import socket
+import threading
+import time
+import urllib.parse
+
+from .OreX_LLMReasoning import ReasoningStripper
+
+# PromptServer нужен для отправки частичного текста в UI ноды при потоковой генерации
+try:
+    from server import PromptServer
+except ImportError:
+    PromptServer = None
+
+try:
+    import comfy.model_management as mm
+except ImportError:
+    mm = None
+
+# Сколько простаивающих соединений держим на один хост (по числу параллельных слотов сервера)
+MAX_IDLE_PER_HOST = 4
+
+# Сколько секунд считаем сервер "живым" после успешной проверки/запроса
+HEALTH_CHECK_TTL = 30.0
+
+# Событие PromptServer с частичным текстом потоковой генерации (слушает js/OreX_LLMStream.js)
+STREAM_EVENT = "orex-llm-stream"
+
+# Минимальный интервал между отправками частичного текста в UI (сек)
+STREAM_UI_INTERVAL = 0.2
+
+# Повторы временных сбоев: число повторов и экспоненциальная задержка base * 2^n (не больше max) со случайным разбросом
+RETRY_ATTEMPTS = int(os.environ.get("OREX_LLM_RETRIES", "2"))
+RETRY_BASE_DELAY = float(os.environ.get("OREX_LLM_RETRY_BASE", "0.5"))
+RETRY_MAX_DELAY = float(os.environ.get("OREX_LLM_RETRY_MAX", "8"))
+# Ответы, после которых запрос можно безопасно повторить (сервер перегружен или ещё загружает модель)
+RETRY_STATUS_CODES = (408, 429, 502, 503, 504)
+# 503 приходит, пока сервер загружает модель (LM Studio — 10–30 с): его повторяем не по числу попыток,
+# а пока суммарное ожидание не превысит этот бюджет (сек)
+LOADING_STATUS_CODE = 503
+LOADING_RETRY_BUDGET = float(os.environ.get("OREX_LLM_LOADING_RETRY_BUDGET", "45"))
+
+# Circuit breaker: после N подряд сетевых сбоев хост считается недоступным на cooldown секунд,
+# затем один пробный запрос решает, закрыть предохранитель или снова открыть
+BREAKER_THRESHOLD = int(os.environ.get("OREX_LLM_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN = float(os.environ.get("OREX_LLM_BREAKER_COOLDOWN", "30"))
+
+
+class LLMHTTPError(Exception):
+    """Сервер ответил кодом ошибки (>= 400)."""
+
+    def __init__(self, code, body, retry_after=None):
+        self.code = code
+        self.body = body
+        self.retry_after = retry_after
+        super().__init__(f"HTTP Error {code}: {body}")
+
+
+class LLMConnectionError(Exception):
+    """Не удалось установить соединение или прочитать ответ."""
+
+    def __init__(self, message, timed_out=False):
+        super().__init__(message)
+        self.timed_out = timed_out
+
+
+class LLMCircuitOpenError(LLMConnectionError):
+    """Хост недавно не отвечал: запрос отклонён сразу, без ожидания таймаута."""
+
+
+class CircuitBreaker:
+    """Предохранитель одного хоста: closed -> open (отказ без сети) -> half-open (один пробный запрос)."""
+
+    def __init__(self, base_url, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.base_url = base_url
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self._failures = 0
+        self._open_until = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_request(self):
+        with self._lock:
+            if self._failures < self.threshold:
+                return
+            remaining = self._open_until - time.monotonic()
+            if remaining > 0 or self._probing:
+                wait = f"retry in {remaining:.0f}s" if remaining > 0 else "probe in progress"
+                raise LLMCircuitOpenError(f"{self.base_url} is unavailable after {self._failures} failed attempts ({wait})")
+            self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            if self._failures >= self.threshold:
+                print(f"[OreX LLM] 🟢 {self.base_url} is reachable again")
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.threshold:
+                if self._failures == self.threshold or self._probing:
+                    print(f"[OreX LLM] 🔴 {self.base_url} failed {self._failures} times in a row, failing fast for {self.cooldown:.0f}s")
+                self._open_until = time.monotonic() + self.cooldown
+            self._probing = False
+
+    def stats(self):
+        with self._lock:
+            is_open = self._failures >= self.threshold
+            return {"state": ("half-open" if self._probing else "open") if is_open else "closed", "consecutive_failures": self._failures}
+
+
+def resolve_host(env_var, default):
+    host = os.environ.get(env_var, default)
+    if not host.startswith("http"):
+        host = f"http://{host}"
+    return host.rstrip("/")
+
+
+class _HostPool:
+    """Пул keep-alive соединений к одному хосту. Соединение в один момент времени принадлежит одному потоку."""
+
+    def __init__(self, base_url):
+        parts = urllib.parse.urlsplit(base_url)
+        self.scheme = parts.scheme or "http"
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port
+        self.prefix = parts.path.rstrip("/")
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _new_connection(self, timeout):
+        conn_cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        return conn_cls(self.host, self.port, timeout=timeout)
+
+    def acquire(self, timeout):
+        """Возвращает (соединение, было_ли_оно_переиспользовано)."""
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            return self._new_connection(timeout), False
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn, True
+
+    def release(self, conn):
+        with self._lock:
+            if len(self._idle) < MAX_IDLE_PER_HOST:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+_BREAKERS = {}
+
+# base_url -> время последнего успешного ответа сервера
+_HEALTHY_UNTIL = {}
+
+
+def _get_pool(base_url):
+    with _POOLS_LOCK:
+        pool = _POOLS.get(base_url)
+        if pool is None:
+            pool = _HostPool(base_url)
+            _POOLS[base_url] = pool
+        return pool
+
+
+def get_breaker(base_url):
+    with _POOLS_LOCK:
+        breaker = _BREAKERS.get(base_url)
+        if breaker is None:
+            breaker = CircuitBreaker(base_url)
+            _BREAKERS[base_url] = breaker
+        return breaker
+
+
+def _mark_healthy(base_url):
+    _HEALTHY_UNTIL[base_url] = time.monotonic() + HEALTH_CHECK_TTL
+
+
+def _mark_unhealthy(base_url):
+    _HEALTHY_UNTIL.pop(base_url, None)
+    get_breaker(base_url).record_failure()
+
+
+def _is_timeout(e):
+    return isinstance(e, (socket.timeout, TimeoutError))
+
+
+def _retry_delay(attempt, retry_after=None):
+    if retry_after is not None:
+        # Retry-After: 0 или отрицательный превратил бы повторы в непрерывный цикл запросов
+        return min(max(retry_after, RETRY_BASE_DELAY), RETRY_MAX_DELAY)
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt))
+    # Разброс не даёт параллельным запросам batch повторяться одновременно
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _sleep_interruptible(seconds):
+    deadline = time.monotonic() + seconds
+    while True:
+        # Прерывание проверяется и перед нулевой паузой: Cancel не должен ждать конца повторов
+        if mm is not None:
+            mm.throw_exception_if_processing_interrupted()
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        time.sleep(min(0.1, remaining))
+
+
+def with_retries(fn, retries=None):
+    """Вызывает fn, повторяя временные сбои: обрыв соединения и коды RETRY_STATUS_CODES.
+
+    503 (модель загружается) повторяется не по числу попыток, а пока время с начала вызова
+    укладывается в LOADING_RETRY_BUDGET. Таймаут чтения не повторяется (иначе ожидание умножится), открытый предохранитель — тоже.
+    """
+    retries = RETRY_ATTEMPTS if retries is None else retries
+    attempt = 0
+    failures = 0
+    started = time.monotonic()
+    while True:
+        try:
+            return fn()
+        except LLMCircuitOpenError:
+            raise
+        except LLMHTTPError as e:
+            if e.code not in RETRY_STATUS_CODES or retries <= 0:
+                raise
+            delay = _retry_delay(attempt, e.retry_after)
+            if e.code == LOADING_STATUS_CODE:
+                elapsed = time.monotonic() - started + delay
+                if elapsed > LOADING_RETRY_BUDGET:
+                    raise
+                progress = f"{elapsed:.0f}/{LOADING_RETRY_BUDGET:.0f}s"
+            else:
+                if failures >= retries:
+                    raise
+                failures += 1
+                progress = f"{failures}/{retries}"
+            reason = f"HTTP {e.code}"
+        except LLMConnectionError as e:
+            if e.timed_out or failures >= retries:
+                raise
+            failures += 1
+            delay = _retry_delay(attempt)
+            progress = f"{failures}/{retries}"
+            reason = str(e)
+        attempt += 1
+        print(f"[OreX LLM] ⏳ {reason}; retry {progress} in {delay:.1f}s")
+        _sleep_interruptible(delay)
+
+
+def open_response(base_url, method, path, payload=None, timeout=30.0, headers=None):
+    """Отправляет запрос и возвращает (pool, conn, response) с непрочитанным телом.
+
+    Вызывающий обязан дочитать тело и вернуть соединение через finish_response().
+    """
+    pool = _get_pool(base_url)
+    breaker = get_breaker(base_url)
+    breaker.before_request()
+    body = None
+    headers = dict(headers or {}, Connection="keep-alive")
+    if payload is not None:
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+        headers["Content-Type"] = "application/json"
+
+    for attempt in range(2):
+        conn, reused = pool.acquire(timeout)
+        try:
+            conn.request(method, pool.prefix + path, body=body, headers=headers)
+            response = conn.getresponse()
+            # Сервер ответил (даже кодом ошибки) — значит, он жив
+            breaker.record_success()
+            return pool, conn, response
+        except (http.client.HTTPException, ConnectionError) as e:
+            conn.close()
+            # Сервер мог закрыть простаивающее keep-alive соединение — одна повторная попытка на свежем сокете
+            if reused and attempt == 0:
+                continue
+            _mark_unhealthy(base_url)
+            raise LLMConnectionError(str(e)) from e
+        except OSError as e:
+            conn.close()
+            _mark_unhealthy(base_url)
+            raise LLMConnectionError(str(e), timed_out=_is_timeout(e)) from e
+
+
+def finish_response(base_url, pool, conn, response, broken=False):
+    """Возвращает соединение в пул, если ответ дочитан и сервер не просил закрыть сокет."""
+    if broken or response.will_close or not response.isclosed():
+        conn.close()
+        if broken:
+            _mark_unhealthy(base_url)
+        return
+    _mark_healthy(base_url)
+    pool.release(conn)
+
+
+def _retry_after(response):
+    try:
+        return float(response.getheader("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _request_once(base_url, method, path, payload, timeout, headers):
+    pool, conn, response = open_response(base_url, method, path, payload, timeout, headers)
+    try:
+        data = response.read()
+    except (http.client.HTTPException, OSError) as e:
+        finish_response(base_url, pool, conn, response, broken=True)
+        raise LLMConnectionError(str(e), timed_out=_is_timeout(e)) from e
+    finish_response(base_url, pool, conn, response)
+
+    if response.status >= 400:
+        raise LLMHTTPError(response.status, data.decode("utf-8", errors="replace"), _retry_after(response))
+    return response.status, data
+
+
+def request(base_url, method, path, payload=None, timeout=30.0, headers=None, retries=None):
+    """Выполняет запрос и возвращает (status, тело в байтах). Коды >= 400 бросают LLMHTTPError.
+
+    Временные сбои повторяются (retries=None — RETRY_ATTEMPTS раз, 0 — без повторов).
+    """
+    return with_retries(lambda: _request_once(base_url, method, path, payload, timeout, headers), retries)
+
+
+def request_json(base_url, method, path, payload=None, timeout=30.0, headers=None, retries=None):
+    _, data = request(base_url, method, path, payload, timeout, headers, retries)
+    return json.loads(data.decode("utf-8")) if data else {}
+
+
+def _open_stream(base_url, path, payload, timeout, headers):
+    pool, conn, response = open_response(base_url, "POST", path, payload, timeout, headers)
+    if response.status >= 400:
+        try:
+            data = response.read()
+        finally:
+            conn.close()
+        raise LLMHTTPError(response.status, data.decode("utf-8", errors="replace"), _retry_after(response))
+    return pool, conn, response
+
+
+def iter_stream_lines(base_url, path, payload, timeout=300.0, headers=None, retries=None):
+    """Генератор непустых строк потокового ответа (SSE или NDJSON).
+
+    Повторяется только открытие потока: после первой строки текст уже ушёл в UI.
+    Закрытие генератора до конца ответа обрывает HTTP-запрос, и сервер прекращает генерацию.
+    """
+    pool, conn, response = with_retries(lambda: _open_stream(base_url, path, payload, timeout, headers), retries)
+
+    completed = False
+    try:
+        while True:
+            line = response.readline()
+            if not line:
+                break
+            line = line.strip()
+            if line:
+                yield line.decode("utf-8", errors="replace")
+        completed = True
+    except (http.client.HTTPException, OSError) as e:
+        _mark_unhealthy(base_url)
+        raise LLMConnectionError(str(e), timed_out=_is_timeout(e)) from e
+    finally:
+        if completed:
+            finish_response(base_url, pool, conn, response)
+        else:
+            # Прерывание пользователем или ошибка: сокет с недочитанным ответом в пул не возвращаем
+            conn.close()
+
+
+class StreamReporter:
+    """Копит потоковый текст, шлёт его в UI ноды и считает time-to-first-token и tokens/sec."""
+
+    def __init__(self, unique_id, hide_reasoning=False):
+        self.unique_id = unique_id
+        # При Thinking OFF превью в ноде показывает текст уже без <think>-блоков, разбирая чанки по мере прихода
+        self.stripper = ReasoningStripper() if hide_reasoning else None
+        self.started = time.perf_counter()
+        self.first_token_at = None
+        self.finished_at = None
+        self.token_count = 0
+        self.content_parts = []
+        self.reasoning_parts = []
+        self._last_sent = 0.0
+
+    @property
+    def content(self):
+        return "".join(self.content_parts)
+
+    @property
+    def reasoning(self):
+        return "".join(self.reasoning_parts)
+
+    def check_interrupted(self):
+        # Кнопка Cancel в ComfyUI: бросает InterruptProcessingException между чанками
+        if mm is not None:
+            mm.throw_exception_if_processing_interrupted()
+
+    def add(self, text, reasoning=False):
+        if not text:
+            return
+        now = time.perf_counter()
+        if self.first_token_at is None:
+            self.first_token_at = now
+        self.token_count += 1
+        (self.reasoning_parts if reasoning else self.content_parts).append(text)
+        if self.stripper is not None and not reasoning:
+            self.stripper.feed(text)
+        if now - self._last_sent >= STREAM_UI_INTERVAL:
+            self._last_sent = now
+            self._send(done=False)
+
+    def finish(self, token_count=None):
+        self.finished_at = time.perf_counter()
+        if token_count:
+            self.token_count = token_count
+        self._send(done=True)
+
+    def _send(self, done):
+        if PromptServer is None or self.unique_id is None:
+            return
+        if self.stripper is not None:
+            text = self.stripper.text
+            if not text and (self.reasoning or self.content_parts):
+                text = "[Thinking...]"
+        else:
+            text = self.content
+            if not text and self.reasoning:
+                text = f"<think>\n{self.reasoning}"
+        try:
+            PromptServer.instance.send_sync(STREAM_EVENT, {"node": str(self.unique_id), "text": text, "done": done})
+        except Exception:
+            pass
+
+    def stats(self):
+        end = self.finished_at or time.perf_counter()
+        ttft = None if self.first_token_at is None else self.first_token_at - self.started
+        gen_time = end - (self.first_token_at or self.started)
+        tps = self.token_count / gen_time if gen_time > 0 and self.token_count else 0.0
+        return {
+            "time_to_first_token_s": None if ttft is None else round(ttft, 3),
+            "tokens_per_second": round(tps, 2),
+            "completion_tokens": self.token_count,
+            "total_time_s": round(end - self.started, 3),
+        }
+
+
+def check_connection(base_url, path, timeout=3.0, headers=None):
+    """Проверка доступности сервера. Успешный результат кэшируется на HEALTH_CHECK_TTL секунд."""
+    if _HEALTHY_UNTIL.get(base_url, 0.0) > time.monotonic():
+        return
+    # Проверка должна быть быстрой: без повторов, при открытом предохранителе — отказ сразу
+    request(base_url, "GET", path, timeout=timeout, headers=headers, retries=0)
+
+
+def close_all():
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+    for pool in pools:
+        pool.close_all()
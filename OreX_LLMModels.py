@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""Фоновое обнаружение моделей LLM серверов: INPUT_TYPES берёт список из памяти и никогда не ждёт сеть."""
+import threading
+import time
+
+try:
+    from server import PromptServer
+    from aiohttp import web
+except ImportError:
+    PromptServer = None
+
+# Период фонового обновления списка моделей (сек)
+MODEL_REFRESH_INTERVAL = 60.0
+
+
+class ModelCatalog:
+    """Кэш списка моделей одного бэкенда, обновляемый отдельным daemon-потоком."""
+
+    def __init__(self, name, fetch_fn, refresh_interval=MODEL_REFRESH_INTERVAL):
+        self.name = name
+        self._fetch_fn = fetch_fn
+        self.refresh_interval = refresh_interval
+        self._models = []
+        self._updated_at = 0.0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name=f"orex-models-{self.name}", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self.refresh()
+            self._wake.wait(self.refresh_interval)
+            self._wake.clear()
+
+    def refresh(self):
+        """Синхронное обновление. При недоступном сервере сохраняется последний удачный список."""
+        try:
+            models = list(self._fetch_fn())
+        except Exception:
+            return self.models
+        with self._lock:
+            self._models = models
+            self._updated_at = time.time()
+        return models
+
+    def request_refresh(self):
+        """Будит фоновый поток, не дожидаясь результата."""
+        self.start()
+        self._wake.set()
+
+    @property
+    def models(self):
+        with self._lock:
+            return list(self._models)
+
+    def choices(self, default_model):
+        models = [m for m in self.models if m != default_model]
+        return [default_model] + models
+
+    def info(self):
+        with self._lock:
+            return {"backend": self.name, "models": list(self._models), "updated_at": self._updated_at}
+
+
+CATALOGS = {}
+
+
+def register_catalog(name, fetch_fn):
+    catalog = CATALOGS.get(name)
+    if catalog is None:
+        catalog = ModelCatalog(name, fetch_fn)
+        CATALOGS[name] = catalog
+    catalog.start()
+    return catalog
+
+
+if PromptServer is not None:
+    @PromptServer.instance.routes.get("/orex/llm_models")
+    async def get_llm_models(request):
+        catalog = CATALOGS.get(request.query.get("backend", ""))
+        if catalog is None:
+            return web.json_response({"error": "Unknown backend"}, status=404)
+        return web.json_response(catalog.info())
+
+    @PromptServer.instance.routes.post("/orex/llm_models/refresh")
+    async def refresh_llm_models(request):
+        catalog = CATALOGS.get(request.query.get("backend", ""))
+        if catalog is None:
+            return web.json_response({"error": "Unknown backend"}, status=404)
+        # Сетевой запрос выполняем вне event loop, чтобы не блокировать сервер ComfyUI
+        loop = PromptServer.instance.loop
+        await loop.run_in_executor(None, catalog.refresh)
+        return web.json_response(catalog.info())
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""Реестр системных пресетов LLM нод с горячей перезагрузкой OreX_Preset_LMStudio_Ollama.json.
+
+Файл перечитывается только при изменении mtime/размера; INPUT_TYPES, process_input и API берут
+уже разобранный словарь из памяти, поэтому правка пресетов не требует перезапуска ComfyUI.
+"""
+import json
+import os
+import threading
+import time
+
+try:
+    from server import PromptServer
+    from aiohttp import web
+except ImportError:
+    PromptServer = None
+
+PRESETS_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "OreX_Preset_LMStudio_Ollama.json")
+
+# Не чаще одного os.stat за этот интервал (сек): INPUT_TYPES и валидация вызывают реестр много раз подряд
+PRESET_STAT_INTERVAL = 1.0
+
+DEFAULT_PRESETS = [
+    {"name": "None", "prompt": ""},
+    {"name": "Детальный анализ", "prompt": "Твоя задача — максимально подробно и детально проанализировать запрос или изображение. Опиши все мелкие детали, контекст и возможные скрытые смыслы."},
+    {"name": "Краткий ответ", "prompt": "Отвечай максимально коротко и по делу, без лишних вступлений и рассуждений. Только суть."}
+]
+
+
+class PresetRegistry:
+    def __init__(self, path=PRESETS_PATH):
+        self.path = path
+        self._presets = {"None": ""}
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._ensure_file()
+
+    def _ensure_file(self):
+        if os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(DEFAULT_PRESETS, f, ensure_ascii=False, indent=4)
+        except Exception as e:
+            print(f"[OreX LLM] Could not create default presets file: {e}")
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._checked_at < PRESET_STAT_INTERVAL:
+            return
+        self._checked_at = now
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return
+        signature = (st.st_mtime_ns, st.st_size)
+        if signature == self._signature:
+            return
+
+        presets = {"None": ""}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for item in data:
+                if "name" in item and "prompt" in item:
+                    presets[item["name"]] = item["prompt"]
+        except Exception as e:
+            # Файл могли сохранить наполовину: оставляем прежние пресеты и перечитаем при следующем изменении
+            print(f"[OreX LLM] Error loading presets from JSON: {e}")
+            self._signature = signature
+            return
+        if self._signature is not None:
+            print(f"[OreX LLM] 🔄 Presets reloaded ({len(presets)} entries)")
+        self._presets = presets
+        self._signature = signature
+
+    def presets(self):
+        with self._lock:
+            self._refresh()
+            return self._presets
+
+    def names(self):
+        return list(self.presets().keys())
+
+    def get(self, name, default=""):
+        return self.presets().get(name, default)
+
+
+PRESETS = PresetRegistry()
+
+
+if PromptServer is not None:
+    @PromptServer.instance.routes.get("/orex/llm_presets")
+    async def get_llm_presets(request):
+        presets = PRESETS.presets()
+        return web.json_response({"names": list(presets.keys()), "presets": presets})
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""Однопроходное удаление скрытых размышлений (<think>, <reasoning>, <|channel|>, [Thinking...]) из ответа LLM.
+
+ReasoningStripper — конечный автомат: текст обрабатывается по мере поступления чанков, каждый символ
+просматривается один раз (ищется только следующий маркер текущего состояния), без повторных проходов
+и откатов цепочки регулярных выражений на длинных (30–100 КБ) рассуждениях.
+"""
+import re
+
+# Маркеры, которые ищет каждое состояние автомата; поиск идёт на стороне C, обычные «<» и «[» не разбираются в Python
+_VISIBLE_MARKERS = re.compile(r"<(/?)(thinking|think|reasoning)>|<\|?channel\|?>|</channel>|\[thinking", re.IGNORECASE)
+# После незакрытого «[Thinking» в хвосте нет ни одной «]» — дальше скобки не ищем
+_VISIBLE_TAGS = re.compile(r"<(/?)(thinking|think|reasoning)>|<\|?channel\|?>|</channel>", re.IGNORECASE)
+_THINK_CLOSE = re.compile(r"</(?:thinking|think|reasoning)>", re.IGNORECASE)
+_CHANNEL_MARKERS = re.compile(r"<\|?channel\|?>|</channel>", re.IGNORECASE)
+_BRACKET_CLOSE = re.compile(r"\]")
+# Самый длинный маркер: </reasoning>. Хвост буфера короче этого с «<» или «[» ждёт следующего чанка
+_MAX_MARKER_LEN = 12
+_THINKING_BRACKET = "[thinking"
+
+# Состояния автомата
+_VISIBLE, _THINK, _CHANNEL, _BRACKET = range(4)
+
+
+class ReasoningStripper:
+    """Инкрементальный фильтр: feed() принимает чанки, text — видимый текст на текущий момент.
+
+    Семантика та же, что у прежней цепочки регулярных выражений (расходится только на вложенных
+    маркерах разных видов, где цепочка оставляла в тексте обрывки тегов):
+    - <think>…</think>, <thinking>, <reasoning> и пары маркеров channel удаляются вместе с содержимым;
+    - одиночный закрывающий тег (</think>, <channel|>, </channel>) означает, что ответ начался внутри
+      размышлений — всё до него отбрасывается;
+    - незакрытый открывающий тег скрывает текст до конца ответа;
+    - [Thinking…] удаляется до первой «]», без «]» остаётся как есть.
+    """
+
+    def __init__(self):
+        self._visible = []
+        self._hidden = []  # содержимое открытого блока: нужно, если блок окажется не размышлением
+        self._pending = ""
+        self._state = _VISIBLE
+        self._channel_opener = ""
+        self._markers = _VISIBLE_MARKERS
+
+    @property
+    def text(self):
+        return "".join(self._visible)
+
+    def feed(self, chunk):
+        if not chunk:
+            return
+        buf = self._pending + chunk if self._pending else chunk
+        self._pending = ""
+        self._scan(buf, final=False)
+
+    def finish(self):
+        """Досматривает хвост и возвращает итоговый текст без пустых строк."""
+        if self._pending:
+            buf, self._pending = self._pending, ""
+            self._scan(buf, final=True)
+        while self._state in (_BRACKET, _CHANNEL):
+            rest = "".join(self._hidden)
+            self._hidden = []
+            if self._state == _BRACKET:
+                # «[Thinking» без «]» — обычный текст: «[» выводим, остальное просматриваем заново
+                self._visible.append("[")
+                rest = rest[1:]
+                self._markers = _VISIBLE_TAGS
+            elif self._channel_opener == "<channel|>":
+                # Единственный маркер оказался закрывающим: всё до него — размышления
+                self._visible = []
+            else:
+                break
+            self._state = _VISIBLE
+            self._scan(rest, final=True)
+        self._hidden = []
+        self._state = _VISIBLE
+        return "\n".join(line for line in self.text.splitlines() if line.strip()).strip()
+
+    def _emit(self, text):
+        if not text:
+            return
+        if self._state == _VISIBLE:
+            self._visible.append(text)
+        elif self._state in (_BRACKET, _CHANNEL):
+            self._hidden.append(text)
+
+    def _scan(self, buf, final):
+        pos = 0
+        end = len(buf)
+        while pos < end:
+            markers = self._markers if self._state == _VISIBLE else _STATE_MARKERS[self._state]
+            found = markers.search(buf, pos)
+            if found is None:
+                safe_end = end if final else self._safe_end(buf, pos)
+                self._emit(buf[pos:safe_end])
+                self._pending = buf[safe_end:]
+                return
+            self._emit(buf[pos:found.start()])
+            self._on_marker(found)
+            pos = found.end()
+
+    @staticmethod
+    def _safe_end(buf, pos):
+        # Маркер может продолжиться в следующем чанке: хвост с последней «<» или «[» придерживаем
+        tail = max(pos, len(buf) - _MAX_MARKER_LEN)
+        cut = max(buf.rfind("<", tail), buf.rfind("[", tail))
+        return cut if cut >= 0 else len(buf)
+
+    def _on_marker(self, found):
+        marker = found.group(0).lower()
+
+        if self._state == _VISIBLE:
+            if marker == _THINKING_BRACKET:
+                self._state = _BRACKET
+                self._hidden = [found.group(0)]
+            elif found.group(2) is not None:
+                if found.group(1):
+                    # Одиночный закрывающий тег: ответ начался внутри размышлений
+                    self._visible = []
+                else:
+                    self._state = _THINK
+            elif marker == "</channel>":
+                self._visible = []
+            else:
+                self._state = _CHANNEL
+                self._channel_opener = marker
+                self._hidden = []
+        elif self._state == _THINK:
+            self._state = _VISIBLE
+        elif self._state == _CHANNEL:
+            if marker == "</channel>":
+                self._visible = []
+            self._state = _VISIBLE
+            self._hidden = []
+        else:
+            self._state = _VISIBLE
+            self._hidden = []
+
+
+_STATE_MARKERS = {
+    _THINK: _THINK_CLOSE,
+    _CHANNEL: _CHANNEL_MARKERS,
+    _BRACKET: _BRACKET_CLOSE,
+}
+
+
+def strip_reasoning(content):
+    """Удаляет скрытые размышления из готового ответа за один проход."""
+    if not content:
+        return ""
+    stripper = ReasoningStripper()
+    stripper.feed(content)
+    return stripper.finish()
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""Менеджер резидентности LLM моделей: выгрузка по простою из одного фонового потока вместо Timer на каждую модель
+и упреждающая загрузка модели, которая понадобится следующей по очереди ComfyUI."""
+import os
+import threading
+import time
+
+try:
+    from server import PromptServer
+    from aiohttp import web
+except ImportError:
+    PromptServer = None
+
+# Период проверки простаивающих моделей (сек)
+RESIDENCY_POLL_INTERVAL = 0.5
+
+# Упреждающая загрузка следующей модели из очереди, пока работают не-LLM ноды (0 — выключить)
+WARMUP_ENABLED = os.environ.get("OREX_LLM_WARMUP", "1") != "0"
+# Сколько моделей одного сервера может быть загружено одновременно: больше не загружаем, чтобы не вытеснить нужную
+WARMUP_MAX_MODELS = int(os.environ.get("OREX_LLM_WARMUP_MAX_MODELS", "2"))
+# Простой, после которого упреждающе загруженная, но так и не использованная нодой модель выгружается (сек)
+WARMUP_IDLE_TIMEOUT = float(os.environ.get("OREX_LLM_WARMUP_IDLE", "600"))
+# Пауза перед повторной попыткой загрузить ту же модель после неудачи (сек)
+WARMUP_RETRY_DELAY = 60.0
+# Не чаще одного чтения очереди ComfyUI за этот интервал (сек): чтение берёт мьютекс очереди исполнителя
+QUEUE_POLL_INTERVAL = 2.0
+
+
+_BACKEND_NAMES = ("lmstudio", "ollama")
+
+
+class _ModelState:
+    def __init__(self):
+        self.resident = False
+        self.in_use = 0
+        self.last_used = 0.0
+        self.idle_timeout = None  # None = автовыгрузка выключена
+        self.unload_fn = None
+        self.loads = 0
+        self.unloads = 0
+        self.load_latency_total = 0.0
+        self.last_load_latency = None
+        self.warming = False
+        self.warmups = 0
+        self.warmup_failed_at = None
+
+    def info(self):
+        return {
+            "resident": self.resident,
+            "in_use": self.in_use,
+            "idle_seconds": round(time.monotonic() - self.last_used, 1) if self.last_used else None,
+            "idle_timeout": self.idle_timeout,
+            "loads": self.loads,
+            "unloads": self.unloads,
+            "last_load_latency_s": None if self.last_load_latency is None else round(self.last_load_latency, 3),
+            "avg_load_latency_s": round(self.load_latency_total / self.loads, 3) if self.loads else None,
+            "warming": self.warming,
+            "warmups": self.warmups,
+        }
+
+
+def _prompt_models(item):
+    prompt = item[2] if len(item) > 2 else {}
+    for node in prompt.values():
+        class_type = str(node.get("class_type", "")).lower()
+        inputs = node.get("inputs", {})
+        model_key = inputs.get("model_key")
+        if not isinstance(model_key, str):
+            continue
+        # Бэкенд задан виджетом (OreXLLMBatch) или угадывается по типу ноды (LM Studio / Ollama ноды)
+        backend = inputs.get("backend")
+        if backend in _BACKEND_NAMES:
+            yield backend, model_key
+            continue
+        for backend_name in _BACKEND_NAMES:
+            if backend_name in class_type:
+                yield backend_name, model_key
+
+
+def _current_queue():
+    if PromptServer is None:
+        return [], []
+    try:
+        queue = PromptServer.instance.prompt_queue
+        # volatile-вариант не делает deepcopy всей очереди под её мьютексом; в старых версиях ComfyUI его нет
+        get_queue = getattr(queue, "get_current_queue_volatile", None) or queue.get_current_queue
+        return get_queue()
+    except Exception:
+        return [], []
+
+
+def pending_queue_models():
+    """Пары (бэкенд, model_key) LLM нод в ещё не начатых заданиях очереди ComfyUI."""
+    _, pending = _current_queue()
+    return {key for item in pending for key in _prompt_models(item)}
+
+
+def queued_models_in_order():
+    """Пары (бэкенд, model_key) ожидающих заданий в порядке, в котором они понадобятся.
+
+    Выполняемое задание не учитывается: его LLM нода могла уже отработать, и модель, выгруженная по
+    Auto Unload, загружалась бы снова и снова до конца задания — как и в _run, спрос дают только ожидающие.
+    """
+    _, pending = _current_queue()
+    ordered = []
+    # Очередь ComfyUI — куча, упорядочиваем по номеру задания
+    for item in sorted(pending, key=lambda i: i[0]):
+        for key in _prompt_models(item):
+            if key not in ordered:
+                ordered.append(key)
+    return ordered
+
+
+class ResidencyManager:
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._warmup_fns = {}
+        self._last_warmup_poll = 0.0
+        self._pending = set()
+        self._pending_at = 0.0
+
+    def _state(self, backend_name, model_key):
+        key = (backend_name, model_key)
+        state = self._models.get(key)
+        if state is None:
+            state = _ModelState()
+            self._models[key] = state
+        return state
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="orex-llm-residency", daemon=True)
+            self._thread.start()
+
+    def register_warmup(self, backend_name, load_fn, unload_fn):
+        """Функции загрузки и выгрузки сервера для упреждающей загрузки.
+
+        Поток не запускается: пока LLM нода ни разу не выполнялась, очередь ComfyUI не опрашивается.
+        """
+        with self._lock:
+            self._warmup_fns[backend_name] = (load_fn, unload_fn)
+
+    def begin(self, backend_name, model_key):
+        """Модель понадобилась ноде: отменяет ожидающую выгрузку. Возвращает True, если модель «холодная»."""
+        with self._lock:
+            state = self._state(backend_name, model_key)
+            state.in_use += 1
+            self._ensure_thread()
+            return not state.resident
+
+    def end(self, backend_name, model_key, used, idle_timeout, unload_fn, load_latency=None):
+        """Нода закончила работу с моделью. idle_timeout=None — не выгружать, 0 — выгрузить, как только очередь не ждёт эту модель."""
+        with self._lock:
+            state = self._state(backend_name, model_key)
+            state.in_use = max(0, state.in_use - 1)
+            if used:
+                if not state.resident:
+                    state.loads += 1
+                    if load_latency is not None:
+                        state.load_latency_total += load_latency
+                        state.last_load_latency = load_latency
+                state.resident = True
+                state.last_used = time.monotonic()
+            state.idle_timeout = idle_timeout
+            state.unload_fn = unload_fn
+            self._ensure_thread()
+
+    def _run(self):
+        while True:
+            time.sleep(RESIDENCY_POLL_INTERVAL)
+            now = time.monotonic()
+            with self._lock:
+                expired = [
+                    (key, state) for key, state in self._models.items()
+                    if state.resident and state.in_use == 0 and state.idle_timeout is not None
+                    and state.unload_fn is not None and now - state.last_used >= state.idle_timeout
+                ]
+            if WARMUP_ENABLED and self._warmup_fns and now - self._last_warmup_poll >= QUEUE_POLL_INTERVAL and self._warmup_possible():
+                self._last_warmup_poll = now
+                self._maybe_warm_up()
+            if not expired:
+                continue
+
+            # Держим модель тёплой, пока в очереди есть задания с LLM нодой на этой же модели;
+            # очередь перечитывается не чаще QUEUE_POLL_INTERVAL, даже если модель долго ждёт своей очереди
+            if now - self._pending_at >= QUEUE_POLL_INTERVAL:
+                self._pending, self._pending_at = pending_queue_models(), now
+            pending = self._pending
+            for key, state in expired:
+                if key in pending:
+                    continue
+                with self._lock:
+                    if state.in_use or not state.resident:
+                        continue
+                    state.resident = False
+                    unload_fn = state.unload_fn
+                try:
+                    unload_fn(key[1])
+                except Exception as e:
+                    print(f"[OreX LLM] ⚠️ Unload of {key[1]} failed: {e}")
+                with self._lock:
+                    state.unloads += 1
+
+    def _warmup_possible(self):
+        """Дешёвая проверка без чтения очереди: нет идущих запросов и есть известная, но не загруженная модель."""
+        with self._lock:
+            states = [(key, s) for key, s in self._models.items() if key[0] in self._warmup_fns]
+            if any(s.in_use or s.warming for _, s in states):
+                return False
+            return any(not s.resident for _, s in states)
+
+    def _maybe_warm_up(self):
+        """Загружает первую ещё не загруженную модель очереди, если это не вытеснит модель, которая нужна сейчас."""
+        ordered = queued_models_in_order()
+        if not ordered:
+            return
+        now = time.monotonic()
+        evict = None
+        with self._lock:
+            # Кандидаты — только модели ожидающих заданий, поэтому модель, выгруженная по Auto Unload (idle_timeout=0),
+            # снова загружается, лишь когда её действительно ждёт следующее задание
+            target = next((key for key in ordered if key[0] in self._warmup_fns and not self._state(*key).resident), None)
+            if target is None:
+                return
+            state = self._state(*target)
+            if state.warming or (state.warmup_failed_at is not None and now - state.warmup_failed_at < WARMUP_RETRY_DELAY):
+                return
+            same_server = [(key, s) for key, s in self._models.items() if key[0] == target[0]]
+            # Идёт генерация на этом сервере — загрузка другой модели могла бы вытеснить её из памяти
+            if any(s.in_use or s.warming for _, s in same_server):
+                return
+            resident = [(key, s) for key, s in same_server if s.resident]
+            if len(resident) >= WARMUP_MAX_MODELS:
+                # Место освобождаем только за счёт модели, которой нет в очереди и которую разрешено выгружать
+                # (Auto Unload ON или загружена упреждающе); нужные и закреплённые пользователем модели не трогаем
+                evict = next((
+                    (key, s) for key, s in resident
+                    if key not in ordered and s.unload_fn is not None and s.idle_timeout is not None
+                ), None)
+                if evict is None:
+                    return
+                evict[1].resident = False
+            state.warming = True
+            load_fn, unload_fn = self._warmup_fns[target[0]]
+
+        if evict is not None:
+            try:
+                evict[1].unload_fn(evict[0][1])
+            except Exception as e:
+                print(f"[OreX LLM] ⚠️ Unload of {evict[0][1]} failed: {e}")
+            with self._lock:
+                evict[1].unloads += 1
+        threading.Thread(target=self._warm_up, args=(target, load_fn, unload_fn), name="orex-llm-warmup", daemon=True).start()
+
+    def _warm_up(self, key, load_fn, unload_fn):
+        print(f"[OreX LLM] 🔥 Pre-loading {key[1]} for the next queued prompt...")
+        started = time.monotonic()
+        try:
+            load_fn(key[1])
+            ok = True
+        except Exception as e:
+            print(f"[OreX LLM] ⚠️ Pre-load of {key[1]} failed: {e}")
+            ok = False
+        with self._lock:
+            state = self._state(*key)
+            state.warming = False
+            if not ok:
+                state.warmup_failed_at = time.monotonic()
+                return
+            state.warmup_failed_at = None
+            if not state.resident:
+                state.resident = True
+                state.loads += 1
+                state.warmups += 1
+                state.load_latency_total += time.monotonic() - started
+                state.last_load_latency = time.monotonic() - started
+            state.last_used = time.monotonic()
+            if state.unload_fn is None:
+                # Модель ещё не использовалась нодой: выгрузится сама, если очередь передумает
+                state.unload_fn = unload_fn
+                state.idle_timeout = WARMUP_IDLE_TIMEOUT
+
+    def stats(self):
+        with self._lock:
+            return {f"{backend}:{model}": state.info() for (backend, model), state in self._models.items()}
+
+
+RESIDENCY = ResidencyManager()
+
+
+if PromptServer is not None:
+    @PromptServer.instance.routes.get("/orex/llm_residency")
+    async def get_llm_residency(request):
+        return web.json_response(RESIDENCY.stats())
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""Сессия диалога для LLM нод: история сообщений между нодами с ограничением по токенам."""
+import hashlib
+
+# Собственный тип ComfyUI: сессию можно передать только во вход session LLM нод
+SESSION_TYPE = "OREX_LLM_SESSION"
+
+DEFAULT_HISTORY_TOKENS = 4096
+# При переполнении история обрезается с запасом (до 60% бюджета), а не по одному ходу:
+# несколько следующих ходов префикс не меняется и сервер берёт его из KV-кэша
+SESSION_TRIM_RATIO = 0.6
+# Грубая оценка токенов изображения (у vision-моделей обычно 256–1024 на кадр)
+IMAGE_TOKEN_ESTIMATE = 768
+
+
+def estimate_tokens(text):
+    """Оценка без токенизатора: ~4 символа на токен."""
+    return len(text) // 4 + 1 if text else 0
+
+
+class SessionTurn:
+    """Один ход диалога: вопрос (текст и JPEG в base64), ответ модели и его оценка в токенах."""
+    __slots__ = ("user_text", "image_b64", "assistant_text", "tokens")
+
+    def __init__(self, user_text, image_b64, assistant_text):
+        self.user_text = user_text or ""
+        self.image_b64 = image_b64
+        self.assistant_text = assistant_text or ""
+        self.tokens = estimate_tokens(self.user_text) + estimate_tokens(self.assistant_text) + (IMAGE_TOKEN_ESTIMATE if image_b64 else 0)
+
+
+class LLMSession:
+    """Неизменяемая история: append возвращает новую сессию.
+
+    ComfyUI кэширует выходы нод, поэтому одна и та же сессия может прийти на вход повторно —
+    изменение на месте задвоило бы ходы. Кортеж ходов общий у всех продолжений, копируются только ссылки.
+    """
+
+    def __init__(self, max_history_tokens=DEFAULT_HISTORY_TOKENS, keep_images=True, turns=(), dropped_turns=0):
+        self.max_history_tokens = max(0, int(max_history_tokens))
+        self.keep_images = keep_images
+        self.turns = tuple(turns)
+        self.dropped_turns = dropped_turns
+
+    @property
+    def history_tokens(self):
+        return sum(t.tokens for t in self.turns)
+
+    def append(self, user_text, image_b64, assistant_text):
+        turns = self.turns + (SessionTurn(user_text, image_b64 if self.keep_images else None, assistant_text),)
+        dropped = self.dropped_turns
+        total = sum(t.tokens for t in turns)
+        if self.max_history_tokens and total > self.max_history_tokens:
+            # Последний ход оставляем всегда, даже если он один больше бюджета
+            target = self.max_history_tokens * SESSION_TRIM_RATIO
+            while len(turns) > 1 and total > target:
+                total -= turns[0].tokens
+                turns = turns[1:]
+                dropped += 1
+        return LLMSession(self.max_history_tokens, self.keep_images, turns, dropped)
+
+    def messages(self):
+        """История в нейтральном виде для build_payload: (role, текст, JPEG base64 или None)."""
+        for turn in self.turns:
+            yield "user", turn.user_text, turn.image_b64
+            yield "assistant", turn.assistant_text, None
+
+    def digest(self):
+        m = hashlib.sha256(f"{self.max_history_tokens}:{self.keep_images}".encode())
+        for turn in self.turns:
+            m.update(turn.user_text.encode("utf-8"))
+            m.update((turn.image_b64 or "").encode())
+            m.update(turn.assistant_text.encode("utf-8"))
+        return m.hexdigest()[:16]
+
+    def to_log(self):
+        return {"turns": len(self.turns), "history_tokens": self.history_tokens, "max_history_tokens": self.max_history_tokens, "dropped_turns": self.dropped_turns}
+
+    def __repr__(self):
+        # IS_CHANGED хэширует str() входов: отпечаток содержимого вместо адреса объекта
+        return f"LLMSession(turns={len(self.turns)}, digest={self.digest()})"
+
+
+class OreXLLMSession:
+    """Начало новой сессии с заданным бюджетом истории; подключается ко входу session LLM ноды."""
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {
+            "max_history_tokens": ("INT", {"default": DEFAULT_HISTORY_TOKENS, "min": 0, "max": 131072, "step": 256}),
+            "keep_images": ("BOOLEAN", {"default": True, "label_on": "🟢 Keep Images ON", "label_off": "🔴 Keep Images OFF"}),
+        }}
+
+    RETURN_TYPES = (SESSION_TYPE,)
+    RETURN_NAMES = ("Session",)
+    FUNCTION = "new_session"
+    CATEGORY = "🤫OreX/LLM"
+
+    def new_session(self, max_history_tokens, keep_images):
+        return (LLMSession(max_history_tokens, keep_images),)
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""Структурированный вывод LLM нод: JSON Schema для сервера, разбор и проверка ответа, поля как отдельные выходы."""
+import json
+import re
+
+# Полная проверка, если установлен jsonschema; иначе встроенная проверка основных ключевых слов
+try:
+    import jsonschema
+except ImportError:
+    jsonschema = None
+
+# Сколько полей объекта выводится на отдельные выходы ноды (по порядку properties схемы)
+STRUCTURED_FIELD_OUTPUTS = 4
+STRUCTURED_RETURN_NAMES = ("JSON",) + tuple(f"Field {i + 1}" for i in range(STRUCTURED_FIELD_OUTPUTS))
+
+_FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_\- ]*$")
+_CODE_FENCE = re.compile(r"^```[a-zA-Z]*\s*|\s*```$")
+
+_TYPE_CHECKS = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None,
+}
+
+
+def parse_schema(text):
+    """Схема из виджета: JSON Schema целиком или список полей через запятую («caption, tags[]»).
+
+    Поле с суффиксом [] — массив строк, остальные — строки; все поля обязательны.
+    """
+    text = (text or "").strip()
+    if not text:
+        return {"type": "object"}
+    if text.startswith("{"):
+        try:
+            schema = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"json_schema is not valid JSON: {e}")
+        if not isinstance(schema, dict):
+            raise ValueError("json_schema must be a JSON object")
+        return schema
+
+    properties = {}
+    for raw in text.replace("\n", ",").split(","):
+        name = raw.strip()
+        if not name:
+            continue
+        is_list = name.endswith("[]")
+        name = name[:-2].strip() if is_list else name
+        if not _FIELD_NAME.match(name):
+            raise ValueError(f"Invalid field name in json_schema: {raw.strip()!r}")
+        properties[name] = {"type": "array", "items": {"type": "string"}} if is_list else {"type": "string"}
+    return {"type": "object", "properties": properties, "required": list(properties), "additionalProperties": False}
+
+
+def field_names(schema):
+    return list((schema.get("properties") or {}).keys())
+
+
+def extract_json(text):
+    """Достаёт JSON из ответа: модели без поддержки схемы иногда оборачивают его в ```json или добавляют текст."""
+    text = _CODE_FENCE.sub("", (text or "").strip())
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    start = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
+    if start < 0:
+        raise ValueError("Response contains no JSON")
+    try:
+        value, _ = json.JSONDecoder().raw_decode(text, start)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Response is not valid JSON: {e}")
+    return value
+
+
+def _validate(value, schema, path, errors):
+    expected = schema.get("type")
+    if expected is not None:
+        types = expected if isinstance(expected, list) else [expected]
+        if not any(_TYPE_CHECKS.get(t, lambda v: True)(value) for t in types):
+            errors.append(f"{path or '$'}: expected {expected}, got {type(value).__name__}")
+            return
+    if "enum" in schema and value not in schema["enum"]:
+        errors.append(f"{path or '$'}: {value!r} is not one of {schema['enum']}")
+    if isinstance(value, dict):
+        properties = schema.get("properties") or {}
+        for name in schema.get("required") or []:
+            if name not in value:
+                errors.append(f"{path or '$'}: missing required field '{name}'")
+        for name, item in value.items():
+            if name in properties:
+                _validate(item, properties[name], f"{path}.{name}" if path else name, errors)
+            elif schema.get("additionalProperties") is False:
+                errors.append(f"{path or '$'}: unexpected field '{name}'")
+    elif isinstance(value, list) and isinstance(schema.get("items"), dict):
+        for i, item in enumerate(value):
+            _validate(item, schema["items"], f"{path}[{i}]", errors)
+
+
+def validate(value, schema):
+    """Список ошибок проверки (пустой — ответ соответствует схеме)."""
+    if jsonschema is not None:
+        validator = jsonschema.validators.validator_for(schema)(schema)
+        return [f"{'.'.join(str(p) for p in e.absolute_path) or '$'}: {e.message}" for e in validator.iter_errors(value)]
+    errors = []
+    _validate(value, schema, "", errors)
+    return errors
+
+
+def field_text(value):
+    """Значение поля для STRING-выхода: строки как есть, список строк — через запятую (теги), прочее — JSON."""
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, list) and all(isinstance(v, str) for v in value):
+        return ", ".join(value)
+    return json.dumps(value, ensure_ascii=False)
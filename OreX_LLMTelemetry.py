@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""Телеметрия LLM нод: токены и задержки каждого запроса в скользящем окне памяти и сводка по моделям."""
+import os
+import statistics
+import threading
+import time
+from collections import deque
+
+try:
+    from server import PromptServer
+    from aiohttp import web
+except ImportError:
+    PromptServer = None
+
+# Сколько последних запросов хранится для сводки
+TELEMETRY_WINDOW = int(os.environ.get("OREX_LLM_STATS_WINDOW", "500"))
+
+# Числовые поля записи, по которым считается сводка
+_METRICS = ("latency_s", "ttft_s", "prompt_tokens", "completion_tokens", "eval_tokens_per_s", "encode_s")
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+class TelemetryStore:
+    def __init__(self, window=TELEMETRY_WINDOW):
+        self._records = deque(maxlen=max(1, window))
+        self._lock = threading.Lock()
+
+    def record(self, record):
+        record = dict(record, timestamp=time.time())
+        with self._lock:
+            self._records.append(record)
+
+    def recent(self, limit=50):
+        with self._lock:
+            return list(self._records)[-limit:]
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    def summary(self):
+        """Сводка по (бэкенд, модель): число запросов, попадания в кэш, ошибки, средние и p50/p95."""
+        with self._lock:
+            records = list(self._records)
+        groups = {}
+        for rec in records:
+            groups.setdefault(f"{rec.get('backend')}:{rec.get('model')}", []).append(rec)
+
+        summary = {}
+        for key, recs in groups.items():
+            served = [r for r in recs if r.get("cache") != "hit" and not r.get("error")]
+            entry = {
+                "requests": len(recs),
+                "cache_hits": sum(1 for r in recs if r.get("cache") == "hit"),
+                "errors": sum(1 for r in recs if r.get("error")),
+                "prompt_tokens_total": sum(r.get("prompt_tokens") or 0 for r in served),
+                "completion_tokens_total": sum(r.get("completion_tokens") or 0 for r in served),
+            }
+            for metric in _METRICS:
+                values = [r[metric] for r in served if r.get(metric) is not None]
+                if values:
+                    entry[metric] = {
+                        "avg": round(statistics.fmean(values), 3),
+                        "p50": round(_percentile(values, 0.5), 3),
+                        "p95": round(_percentile(values, 0.95), 3),
+                    }
+            summary[key] = entry
+        return summary
+
+
+TELEMETRY = TelemetryStore()
+
+
+if PromptServer is not None:
+    @PromptServer.instance.routes.get("/orex/llm_stats")
+    async def get_llm_stats(request):
+        try:
+            limit = int(request.query.get("recent", "0"))
+        except ValueError:
+            limit = 0
+        data = {"window": TELEMETRY._records.maxlen, "models": TELEMETRY.summary()}
+        if limit > 0:
+            data["recent"] = TELEMETRY.recent(limit)
+        return web.json_response(data)
+
+    @PromptServer.instance.routes.post("/orex/llm_stats/reset")
+    async def reset_llm_stats(request):
+        TELEMETRY.clear()
+        return web.json_response({"status": "ok"})
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""Общий конвейер IMAGE-тензор -> JPEG/base64 для LLM нод с кэшем по отпечатку кадра."""
+import base64
+import io
+import threading
+from collections import OrderedDict
+
+import torch
+import torch.nn.functional as F
+from PIL import Image
+
+from .OreX_Fingerprint import tensor_fingerprint
+
+# Сколько закодированных кадров держим в памяти (повторные запуски и batch с повторами кадров)
+ENCODE_CACHE_SIZE = 64
+
+
+class EncodedImage:
+    """Один JPEG-буфер, из которого берутся и полезная нагрузка, и превью для лога."""
+
+    def __init__(self, jpeg_bytes, width, height):
+        self.jpeg_bytes = jpeg_bytes
+        self.width = width
+        self.height = height
+        self.b64 = base64.b64encode(jpeg_bytes).decode("utf-8")
+
+    @property
+    def data_url(self):
+        return f"data:image/jpeg;base64,{self.b64}"
+
+    @property
+    def preview(self):
+        img_str = self.b64
+        return f"{img_str[:10]}...{img_str[-10:]}" if len(img_str) > 23 else img_str
+
+
+_CACHE = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+
+def _target_size(height, width, target_megapixels):
+    target_pixels = target_megapixels * 1000000
+    current_pixels = width * height
+    if target_megapixels <= 0 or current_pixels <= target_pixels:
+        return height, width
+    scale_factor = (target_pixels / current_pixels) ** 0.5
+    return max(1, int(height * scale_factor)), max(1, int(width * scale_factor))
+
+
+def tensor_to_uint8(frame, target_megapixels=0.7):
+    """Уменьшение и перевод в uint8 прямо на тензоре (HWC float 0..1 -> HWC uint8), без промежуточного PIL."""
+    frame = frame.detach()
+    if frame.dim() == 4:
+        frame = frame[0]
+    height, width = frame.shape[0], frame.shape[1]
+    new_h, new_w = _target_size(height, width, target_megapixels)
+    if (new_h, new_w) != (height, width):
+        # bicubic + antialias по качеству близок к LANCZOS из PIL
+        chw = frame.movedim(-1, 0).unsqueeze(0).float()
+        frame = F.interpolate(chw, size=(new_h, new_w), mode="bicubic", antialias=True)[0].movedim(0, -1)
+    frame = frame[..., :3]
+    return frame.mul(255).clamp_(0, 255).to(torch.uint8).cpu()
+
+
+def encode_frame(frame, target_megapixels=0.7, jpeg_quality=75):
+    """Кодирует один кадр IMAGE в JPEG. Результат кэшируется по полному хэшу содержимого и параметрам.
+
+    Выборочный отпечаток здесь не годится: кадр с мелкой правкой получил бы чужой JPEG, и модель описала бы не то изображение.
+    """
+    key = (tensor_fingerprint(frame, full=True), float(target_megapixels), int(jpeg_quality))
+    with _CACHE_LOCK:
+        cached = _CACHE.get(key)
+        if cached is not None:
+            _CACHE.move_to_end(key)
+            return cached
+
+    pixels = tensor_to_uint8(frame, target_megapixels)
+    pil_image = Image.fromarray(pixels.numpy())
+    buffered = io.BytesIO()
+    pil_image.save(buffered, format="JPEG", quality=int(jpeg_quality))
+    encoded = EncodedImage(buffered.getvalue(), pil_image.width, pil_image.height)
+
+    with _CACHE_LOCK:
+        _CACHE[key] = encoded
+        while len(_CACHE) > ENCODE_CACHE_SIZE:
+            _CACHE.popitem(last=False)
+    return encoded
+
+
+# --- режим плиток для крупных изображений ---
+
+# Перекрытие соседних плиток (доля стороны ячейки), чтобы мелкий текст на границе попадал в плитку целиком
+TILE_OVERLAP = 0.1
+# Допустимое соотношение сторон ячейки сетки: узкие полосы модели распознают хуже
+TILE_MAX_ASPECT = 2.0
+
+
+def tile_grid(height, width, tile_pixels, max_tiles):
+    """(rows, cols) сетки: самая мелкая, ячейки которой не надо уменьшать до tile_pixels, но не больше max_tiles ячеек.
+
+    Если бюджета не хватает на полное разрешение — самая крупная сетка в пределах max_tiles.
+    None, если плитки не нужны (изображение и так не уменьшается) или бюджет меньше двух плиток.
+    """
+    if max_tiles < 2 or height * width <= tile_pixels:
+        return None
+    grids = [(r, c) for r in range(1, max_tiles + 1) for c in range(1, max_tiles // r + 1) if r * c >= 2]
+    shaped = [(r, c) for r, c in grids if 1 / TILE_MAX_ASPECT <= (width / c) / (height / r) <= TILE_MAX_ASPECT]
+    grids = shaped or grids
+
+    def aspect_error(grid):
+        r, c = grid
+        return abs((width / c) / (height / r) - 1)
+
+    for r, c in sorted(grids, key=lambda g: (g[0] * g[1], aspect_error(g))):
+        if (height / r) * (width / c) * (1 + TILE_OVERLAP) ** 2 <= tile_pixels:
+            return r, c
+    return max(grids, key=lambda g: (g[0] * g[1], -aspect_error(g)))
+
+
+def tile_boxes(height, width, rows, cols, overlap=TILE_OVERLAP):
+    """Прямоугольники (top, left, h, w) плиток с перекрытием, построчно сверху вниз, слева направо."""
+    def spans(size, count):
+        cell = size / count
+        length = min(size, int(round(cell * (1 + overlap))))
+        return [(min(max(0, int(round(i * cell - (length - cell) / 2))), size - length), length) for i in range(count)]
+
+    return [(top, left, h, w) for top, h in spans(height, rows) for left, w in spans(width, cols)]
+
+
+def tile_plan(height, width, target_megapixels=0.7, budget_megapixels=2.8):
+    """Обзорный кадр плюс перекрывающиеся плитки в пределах бюджета пикселей: [(подпись, (top, left, h, w) или None)].
+
+    Каждое изображение не больше target_megapixels, всего их не больше budget_megapixels / target_megapixels —
+    стоимость запроса предсказуема. Первым идёт обзор всего кадра ("overview", None).
+    """
+    plan = [("overview", None)]
+    if target_megapixels <= 0:
+        return plan
+    grid = tile_grid(height, width, target_megapixels * 1000000, int(budget_megapixels / target_megapixels + 1e-6) - 1)
+    if grid is None:
+        return plan
+    rows, cols = grid
+    for i, box in enumerate(tile_boxes(height, width, rows, cols)):
+        plan.append((f"tile {i + 1}/{rows * cols} (row {i // cols + 1}, column {i % cols + 1})", box))
+    return plan
+
+
+def encode_region(frame, box, target_megapixels=0.7, jpeg_quality=75):
+    """Кодирует весь кадр (box=None) или его прямоугольник (top, left, h, w)."""
+    if frame.dim() == 4:
+        frame = frame[0]
+    if box is not None:
+        top, left, h, w = box
+        frame = frame[top:top + h, left:left + w]
+    return encode_frame(frame, target_megapixels, jpeg_quality)
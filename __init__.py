@@ -5,6 +5,8 @@ from .OreXImageLoadBatchSize import OreXImageLoadBatchSize
 from .OreXKontextPresets import KontextPresetsOrex
 from .OreX_LMStudio import OreXLMStudio
 from .OreX_Ollama import OreXOllama
+from .OreX_LLMSession import OreXLLMSession
+from .OreX_LLMBatch import OreXLLMBatch
 from .OreX_Crop import OreXCrop
 from .OreX_Ratio import OreXRatio
 from .OreX_StringFunction import OreX_StringFunction
@@ -31,6 +33,8 @@ NODE_CLASS_MAPPINGS = {
     "orex Kontext Presets": KontextPresetsOrex,
     "orex LMStudio": OreXLMStudio,
     "orex Ollama": OreXOllama,
+    "orex LLM Session": OreXLLMSession,
+    "orex LLM Batch": OreXLLMBatch,
     "orex Crop": OreXCrop,
     "orex Ratio": OreXRatio,
     "orex String Function": OreX_StringFunction,
@@ -57,6 +61,8 @@ NODE_DISPLAY_NAME_MAPPINGS = {
     "orex Kontext Presets": "📦 Kontext Presets (OreX)",
     "orex LMStudio": "🤖 LMStudio (OreX)",
     "orex Ollama": "🦙 Ollama (OreX)",
+    "orex LLM Session": "💬 LLM Session (OreX)",
+    "orex LLM Batch": "📚 LLM Batch From File (OreX)",
     "orex Crop": "🔳Crop (OreX)",
     "orex Ratio": "📐 Ratio (OreX)",
     "orex String Function": "✍️ String Function (OreX)",
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""Бенчмарк клиентской части LLM нод на mock сервере (без GPU и без настоящей модели).
+
+Показывает:
+  - стоимость установки соединения (пул keep-alive против нового соединения на каждый запрос);
+  - накладные расходы клиента на запрос: обычный ответ и поток SSE/NDJSON, LM Studio и Ollama;
+  - время кодирования изображения в JPEG (нужен torch);
+  - пропускную способность очереди хоста, когда рабочих больше, чем слотов;
+  - масштабирование по числу параллельных запросов через очередь хоста (нужен torch для слоя бэкендов).
+
+Запуск из корня репозитория:  python benchmarks/bench_llm_client.py [--requests 200] [--latency-ms 50]
+"""
+import argparse
+import http.client
+import importlib
+import os
+import statistics
+import sys
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.realpath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from mock_llm_server import MockConfig, start_mock_server  # noqa: E402
+
+# Модули нод импортируются как подмодули пакета без выполнения __init__.py (ему нужен ComfyUI)
+_PACKAGE = "orex_llm_bench"
+_pkg = types.ModuleType(_PACKAGE)
+_pkg.__path__ = [ROOT]
+sys.modules.setdefault(_PACKAGE, _pkg)
+
+
+def load(module_name):
+    return importlib.import_module(f"{_PACKAGE}.{module_name}")
+
+
+def try_load(module_name):
+    try:
+        return load(module_name)
+    except ImportError as e:
+        print(f"  (skipped: {module_name} needs {e.name})")
+        return None
+
+
+def timed(fn, count):
+    samples = []
+    for _ in range(count):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def report(name, samples):
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"  {name:<42}{statistics.mean(samples) * 1e6:>10.0f} µs  p50 {statistics.median(samples) * 1e6:>8.0f}  p95 {p95 * 1e6:>8.0f}")
+
+
+def bench_connection_setup(client, url, count):
+    print("\nConnection setup (GET /v1/models)")
+    parts = url.split("//", 1)[1]
+    host, port = parts.split(":")
+
+    def fresh_connection():
+        conn = http.client.HTTPConnection(host, int(port), timeout=5)
+        conn.request("GET", "/v1/models")
+        conn.getresponse().read()
+        conn.close()
+
+    fresh = timed(fresh_connection, count)
+    pooled = timed(lambda: client.request_json(url, "GET", "/v1/models"), count)
+    report("new connection per request", fresh)
+    report("OreX client (keep-alive pool)", pooled)
+    print(f"  {'setup cost saved per request':<42}{(statistics.mean(fresh) - statistics.mean(pooled)) * 1e6:>10.0f} µs")
+
+
+def bench_request_overhead(client, url, count, tokens):
+    print(f"\nClient overhead per request (mock latency 0, {tokens} tokens)")
+    messages = [{"role": "system", "content": "You are a captioner."}, {"role": "user", "content": "Describe"}]
+
+    def openai_complete():
+        client.request_json(url, "POST", "/v1/chat/completions", {"model": "mock-model", "messages": messages, "stream": False})
+
+    def openai_stream():
+        payload = {"model": "mock-model", "messages": messages, "stream": True}
+        for _ in client.iter_stream_lines(url, "/v1/chat/completions", payload):
+            pass
+
+    def ollama_complete():
+        client.request_json(url, "POST", "/api/chat", {"model": "mock-model", "messages": messages, "stream": False})
+
+    def ollama_stream():
+        for _ in client.iter_stream_lines(url, "/api/chat", {"model": "mock-model", "messages": messages, "stream": True}):
+            pass
+
+    report("LM Studio /v1/chat/completions", timed(openai_complete, count))
+    report("LM Studio /v1/chat/completions (SSE)", timed(openai_stream, count))
+    report("Ollama /api/chat", timed(ollama_complete, count))
+    report("Ollama /api/chat (NDJSON)", timed(ollama_stream, count))
+
+
+def bench_backend_overhead(backend_module, count):
+    print("\nBackend layer per request (payload build + host queue + parsing)")
+    for backend in (backend_module.LMSTUDIO_BACKEND, backend_module.OLLAMA_BACKEND):
+        payload = backend.build_payload("mock-model", "You are a captioner.", "Describe", None, {})
+        report(f"{backend.label} chat()", timed(lambda: backend.chat(payload, 30), count))
+        report(f"{backend.label} chat(stream=True)", timed(lambda: backend.chat(payload, 30, stream=True), count))
+
+
+def bench_image_encoding(count):
+    print("\nImage encoding (IMAGE tensor -> JPEG, target 0.7 MP, quality 75)")
+    if count < 1:
+        return
+    vision = try_load("OreX_VisionEncode")
+    if vision is None:
+        return
+    import torch
+
+    for side in (512, 1024, 2048):
+        frames = [torch.rand(side, side, 3) for _ in range(count)]
+        it = iter(frames)
+        report(f"{side}x{side} encode (cache miss)", timed(lambda: vision.encode_frame(next(it)), count))
+        report(f"{side}x{side} encode (cache hit)", timed(lambda: vision.encode_frame(frames[0]), count))
+
+
+def bench_host_limiter(backend_module, latency_ms, slots=4, jobs=64):
+    """Пропускная способность очереди хоста без сети: рабочих больше, чем слотов, не должно быть медленнее."""
+    if backend_module is None:
+        return
+    print(f"\nHost queue throughput ({slots} slots, {latency_ms:.0f} ms jobs, {jobs} jobs)")
+    ideal = slots / (latency_ms / 1000.0)
+    for workers in (slots, slots * 2, slots * 4):
+        limiter = backend_module.HostLimiter(max_in_flight=slots, max_queued=jobs)
+        waits = []
+
+        def job(_):
+            queued_at = time.perf_counter()
+            with limiter.slot():
+                waits.append(time.perf_counter() - queued_at)
+                time.sleep(latency_ms / 1000.0)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(job, range(jobs)))
+        rate = jobs / (time.perf_counter() - started)
+        print(f"  workers {workers:<3}{rate:>10.1f} req/s   ideal {ideal:.1f}   mean wait {statistics.mean(waits) * 1000:>7.1f} ms")
+
+
+def bench_concurrency(backend_module, client, config, url, count, latency_ms):
+    print(f"\nConcurrency scaling (mock latency {latency_ms:.0f} ms, {count} requests)")
+    config.latency_ms = latency_ms
+    if backend_module is not None:
+        backend = backend_module.OLLAMA_BACKEND
+        payload = backend.build_payload("mock-model", "", "Describe", None, {})
+        call = lambda: backend.chat(payload, 30)  # noqa: E731
+        limit = backend_module.MAX_IN_FLIGHT_PER_HOST
+        print(f"  through backend.chat(), host queue limit {limit}")
+    else:
+        call = lambda: client.request_json(url, "POST", "/api/chat", {"model": "mock-model", "messages": [], "stream": False})  # noqa: E731
+        limit = None
+        print("  through the plain client (no host queue)")
+
+    ideal = latency_ms / 1000.0
+    for workers in (1, 2, 4, 8):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(lambda _: call(), range(count)))
+        elapsed = time.perf_counter() - started
+        rate = count / elapsed
+        print(f"  workers {workers:<3}{rate:>10.1f} req/s   efficiency vs ideal {rate * ideal / min(workers, limit or workers) * 100:>6.1f} %")
+    config.latency_ms = 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200, help="запросов на каждый замер накладных расходов")
+    parser.add_argument("--tokens", type=int, default=64, help="токенов в ответе mock сервера")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="задержка сервера для замера параллелизма")
+    parser.add_argument("--concurrency-requests", type=int, default=64)
+    parser.add_argument("--images", type=int, default=10, help="кадров на каждый размер изображения")
+    args = parser.parse_args()
+
+    config = MockConfig(tokens=args.tokens)
+    server, url = start_mock_server(config=config)
+    # Слой бэкендов читает адреса из окружения, поэтому направляем его на mock до импорта
+    os.environ["LMSTUDIO_URL"] = url
+    os.environ["OLLAMA_URL"] = url
+    print(f"Mock LLM server: {url}")
+
+    client = load("OreX_LLMClient")
+    bench_connection_setup(client, url, args.requests)
+    bench_request_overhead(client, url, args.requests, args.tokens)
+
+    print("\nLoading backend layer...")
+    backend_module = try_load("OreX_LLMBackend")
+    if backend_module is not None:
+        bench_backend_overhead(backend_module, args.requests)
+    bench_image_encoding(args.images)
+    bench_host_limiter(backend_module, args.latency_ms)
+    bench_concurrency(backend_module, client, config, url, args.concurrency_requests, args.latency_ms)
+
+    print(f"\nMock server handled {config.requests} requests")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
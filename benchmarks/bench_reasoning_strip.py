@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""Микро-бенчмарк: однопроходный ReasoningStripper против прежней цепочки из семи регулярных выражений.
+
+Запуск из корня репозитория:  python benchmarks/bench_reasoning_strip.py [--sizes 10,30,100] [--repeat 5]
+"""
+import argparse
+import importlib.util
+import os
+import re
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+# Модуль грузим по пути, чтобы не импортировать весь пакет нод (ему нужен ComfyUI)
+_spec = importlib.util.spec_from_file_location("orex_llm_reasoning", os.path.join(ROOT, "OreX_LLMReasoning.py"))
+reasoning = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(reasoning)
+
+# Прежняя реализация clean_reasoning_content — эталон для сравнения
+REASONING_PATTERNS = [
+    re.compile(r'<\|?channel\|?>.*?<\|?channel\|?>', re.DOTALL | re.IGNORECASE),
+    re.compile(r'<(thinking|think|reasoning)>.*?</\1>', re.DOTALL | re.IGNORECASE),
+    re.compile(r'^.*?</(thinking|think|reasoning)>', re.DOTALL | re.IGNORECASE),
+    re.compile(r'^.*?(?:<channel\|>|</channel>)', re.DOTALL | re.IGNORECASE),
+    re.compile(r'<\|?channel\|?>.*$', re.DOTALL | re.IGNORECASE),
+    re.compile(r'<(thinking|think|reasoning)>.*$', re.IGNORECASE),
+    re.compile(r'\[Thinking.*?\]', re.DOTALL | re.IGNORECASE)
+]
+
+
+def regex_chain(content):
+    text = content
+    for pattern in REASONING_PATTERNS:
+        text = pattern.sub('', text)
+    return '\n'.join(line for line in text.splitlines() if line.strip()).strip()
+
+
+def make_samples(kb):
+    line = "Let me think about the image: the <b>lighting</b> is soft, 3 < 5 and [note] holds.\n"
+    body = line * max(1, kb * 1024 // len(line))
+    answer = "A cozy room with warm light and a cat on the sofa."
+    return {
+        "think block": f"<think>\n{body}</think>\n\n{answer}",
+        "orphan close": f"{body}</think>\n{answer}",
+        "channel pair": f"<|channel|>analysis<|message|>{body}<|end|><|start|>assistant<|channel|>final<|message|>{answer}",
+        "no reasoning": body + answer,
+        # Много открывающих маркеров без закрытия: нежадные .*? регулярок просматривают хвост от каждого
+        "unclosed tags": "[Thinking step\n" * max(1, kb * 1024 // 15) + answer,
+    }
+
+
+def bench(fn, text, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def streamed(text, chunk=16):
+    stripper = reasoning.ReasoningStripper()
+    for i in range(0, len(text), chunk):
+        stripper.feed(text[i:i + chunk])
+    return stripper.finish()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10,30,100", help="размеры рассуждений в КБ через запятую")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    # streamed — тот же текст чанками по 16 символов (как токены потоковой генерации)
+    print(f"{'case':<14}{'KB':>6}{'regex ms':>12}{'one-pass ms':>14}{'streamed ms':>14}{'speedup':>10}  same")
+    for kb in (int(s) for s in args.sizes.split(",")):
+        for name, text in make_samples(kb).items():
+            t_regex = bench(regex_chain, text, args.repeat)
+            t_single = bench(reasoning.strip_reasoning, text, args.repeat)
+            t_stream = bench(streamed, text, args.repeat)
+            same = regex_chain(text) == reasoning.strip_reasoning(text) == streamed(text)
+            print(f"{name:<14}{kb:>6}{t_regex * 1000:>12.2f}{t_single * 1000:>14.2f}{t_stream * 1000:>14.2f}{t_regex / t_single:>9.1f}x  {same}")
+
+
+if __name__ == "__main__":
+    main()
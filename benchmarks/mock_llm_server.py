@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""Mock LLM сервер для замеров клиентской части LLM нод без GPU.
+
+Имитирует LM Studio (/v1/models, /v1/chat/completions, в т.ч. SSE) и Ollama (/api/tags, /api/chat,
+в т.ч. NDJSON, /api/generate). Задержка до первого токена и интервал между токенами настраиваются.
+
+Отдельный запуск:  python benchmarks/mock_llm_server.py --port 1234 --latency-ms 50 --tokens 64
+Затем LMSTUDIO_URL=http://127.0.0.1:1234 (или OLLAMA_URL) направит ноды ComfyUI на него.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MOCK_MODELS = ["mock-model", "mock-vision-model"]
+
+
+class MockConfig:
+    def __init__(self, latency_ms=0.0, token_interval_ms=0.0, tokens=16, reasoning_tokens=0):
+        self.latency_ms = latency_ms  # «prefill»: пауза до первого токена
+        self.token_interval_ms = token_interval_ms
+        self.tokens = tokens
+        self.reasoning_tokens = reasoning_tokens
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def count(self):
+        with self._lock:
+            self.requests += 1
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, как у настоящих серверов
+    # Заголовки и тело уходят отдельными write: без TCP_NODELAY Nagle + delayed ACK дают ~40 мс на ответ
+    disable_nagle_algorithm = True
+    server_version = "OreXMockLLM/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def config(self):
+        return self.server.config
+
+    # --- helpers ---
+
+    def _send_json(self, obj, status=200):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_chunked(self, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _tokens(self, payload):
+        """(reasoning-токены, токены ответа) с паузами, имитирующими генерацию."""
+        cfg = self.config
+        if cfg.latency_ms:
+            time.sleep(cfg.latency_ms / 1000.0)
+        prompt = json.dumps(payload.get("messages", []))
+        for i in range(cfg.reasoning_tokens):
+            yield True, f"step{i} "
+            if cfg.token_interval_ms:
+                time.sleep(cfg.token_interval_ms / 1000.0)
+        for i in range(cfg.tokens):
+            yield False, f"tok{i} " if i else f"[{len(prompt)}] "
+            if cfg.token_interval_ms:
+                time.sleep(cfg.token_interval_ms / 1000.0)
+
+    # --- routes ---
+
+    def do_GET(self):
+        self.config.count()
+        if self.path == "/v1/models":
+            self._send_json({"object": "list", "data": [{"id": m, "object": "model"} for m in MOCK_MODELS]})
+        elif self.path == "/api/tags":
+            self._send_json({"models": [{"name": m} for m in MOCK_MODELS]})
+        else:
+            self._send_json({"error": f"Unexpected endpoint {self.path}"}, 404)
+
+    def do_POST(self):
+        self.config.count()
+        payload = self._read_json()
+        if self.path == "/v1/chat/completions":
+            self._openai_chat(payload)
+        elif self.path == "/api/chat":
+            self._ollama_chat(payload)
+        elif self.path in ("/api/generate", "/api/v1/models/unload"):
+            self._send_json({"done": True})
+        else:
+            self._send_json({"error": f"Unexpected endpoint {self.path}"}, 404)
+
+    def _openai_chat(self, payload):
+        started = time.perf_counter()
+        usage = {"prompt_tokens": len(json.dumps(payload.get("messages", []))) // 4, "completion_tokens": self.config.tokens}
+        if not payload.get("stream"):
+            content, reasoning = [], []
+            for is_reasoning, token in self._tokens(payload):
+                (reasoning if is_reasoning else content).append(token)
+            message = {"role": "assistant", "content": "".join(content)}
+            if reasoning:
+                message["reasoning_content"] = "".join(reasoning)
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+            self._send_json({
+                "id": "chatcmpl-mock", "object": "chat.completion", "model": payload.get("model"),
+                "choices": [{"index": 0, "message": message, "finish_reason": "stop"}], "usage": usage,
+                "timings": {"prompt_ms": self.config.latency_ms, "predicted_ms": (time.perf_counter() - started) * 1000},
+            })
+            return
+
+        self._start_chunked("text/event-stream")
+        for is_reasoning, token in self._tokens(payload):
+            delta = {"reasoning_content": token} if is_reasoning else {"content": token}
+            self._chunk(f"data: {json.dumps({'choices': [{'index': 0, 'delta': delta}]})}\n\n".encode("utf-8"))
+        if (payload.get("stream_options") or {}).get("include_usage"):
+            self._chunk(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n".encode("utf-8"))
+        self._chunk(b"data: [DONE]\n\n")
+        self._end_chunked()
+
+    def _ollama_chat(self, payload):
+        started = time.perf_counter()
+        stats = {
+            "done": True, "load_duration": 0,
+            "prompt_eval_count": len(json.dumps(payload.get("messages", []))) // 4,
+            "prompt_eval_duration": int(self.config.latency_ms * 1e6),
+            "eval_count": self.config.tokens,
+        }
+        if payload.get("stream") is False:
+            content, thinking = [], []
+            for is_reasoning, token in self._tokens(payload):
+                (thinking if is_reasoning else content).append(token)
+            message = {"role": "assistant", "content": "".join(content)}
+            if thinking:
+                message["thinking"] = "".join(thinking)
+            stats["eval_duration"] = int((time.perf_counter() - started) * 1e9)
+            self._send_json(dict(stats, model=payload.get("model"), message=message))
+            return
+
+        # У Ollama поток включён по умолчанию
+        self._start_chunked("application/x-ndjson")
+        for is_reasoning, token in self._tokens(payload):
+            message = {"role": "assistant", "content": "", "thinking": token} if is_reasoning else {"role": "assistant", "content": token}
+            self._chunk((json.dumps({"model": payload.get("model"), "message": message, "done": False}) + "\n").encode("utf-8"))
+        stats["eval_duration"] = int((time.perf_counter() - started) * 1e9)
+        self._chunk((json.dumps(dict(stats, message={"role": "assistant", "content": ""})) + "\n").encode("utf-8"))
+        self._end_chunked()
+
+
+def start_mock_server(host="127.0.0.1", port=0, config=None):
+    """Запускает сервер в daemon-потоке. Возвращает (server, base_url); остановка — server.shutdown()."""
+    server = ThreadingHTTPServer((host, port), MockHandler)
+    server.daemon_threads = True
+    server.config = config or MockConfig()
+    threading.Thread(target=server.serve_forever, name="orex-mock-llm", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock LM Studio / Ollama server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1234)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="пауза до первого токена")
+    parser.add_argument("--token-interval-ms", type=float, default=0.0, help="пауза между токенами")
+    parser.add_argument("--tokens", type=int, default=16, help="токенов в ответе")
+    parser.add_argument("--reasoning-tokens", type=int, default=0, help="токенов размышлений перед ответом")
+    args = parser.parse_args()
+
+    config = MockConfig(args.latency_ms, args.token_interval_ms, args.tokens, args.reasoning_tokens)
+    server, url = start_mock_server(args.host, args.port, config)
+    print(f"[OreX Mock LLM] Listening on {url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
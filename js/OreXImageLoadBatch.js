@@ -9,7 +9,9 @@ const BATCH_LOAD_HELP_DESCRIPTIONS = [
     { icon: "🔄", name: "control after generate", label: "Behavior of the seed / Поведение сида", desc: "Determines the behavior of the seed before generation. (Do not select the fixed mode!)", ru_desc: "Определяет поведение сида перед генерацией. (Не выбирать режим fixed!)" },
     { icon: "🔄", name: "control before generate", label: "Behavior of the seed / Поведение сида", desc: "Determines the behavior of the seed before generation. (Do not select the fixed mode!)", ru_desc: "Определяет поведение сида перед генерацией. (Не выбирать режим fixed!)" },
     { icon: "🏷️", name: "label", label: "Batch Identifier / Идентификатор батча", desc: "Unique group name (ID); protects against conflicts if there are two such nodes on the canvas", ru_desc: "Уникальное имя группы (ID); защищает от конфликтов, если на холсте две такие ноды" },
-    { icon: "🖼️", name: "allow_rgba_output", label: "Alpha Channel / Альфа-канал", desc: "🟢ON - keep transparent alpha layer (RGBA); 🔴OFF - force-convert to standard RGB", ru_desc: "🟢ON - сохранять прозрачный альфа-канал (RGBA); 🔴OFF - принудительно переводить в RGB" }
+    { icon: "🖼️", name: "allow_rgba_output", label: "Alpha Channel / Альфа-канал", desc: "🟢ON - keep transparent alpha layer (RGBA); 🔴OFF - force-convert to standard RGB", ru_desc: "🟢ON - сохранять прозрачный альфа-канал (RGBA); 🔴OFF - принудительно переводить в RGB" },
+    { icon: "📐", name: "max_side", label: "Max Side / Макс. сторона", desc: "Downscale while decoding so the longer side fits (JPEG decodes directly at 1/2..1/8 scale); 0 - original size", ru_desc: "Уменьшать уже при декодировании, чтобы длинная сторона не превышала значение (JPEG сразу декодируется в масштабе 1/2..1/8); 0 - исходный размер" },
+    { icon: "🧮", name: "max_megapixels", label: "Max Megapixels / Макс. мегапикселей", desc: "Downscale while decoding to at most this many megapixels; 0 - no limit", ru_desc: "Уменьшать уже при декодировании до указанного числа мегапикселей; 0 - без ограничения" }
 ];
 
 app.registerExtension({
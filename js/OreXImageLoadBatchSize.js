@@ -8,7 +8,9 @@ const BATCH_SIZE_HELP_DESCRIPTIONS = [
     { keys: ["label"], icon: "🏷️", label: "label / идентификатор сессии", desc: "Change this name to force rescan the folder and pick up new files", ru_desc: "Измените это имя, чтобы заново просканировать папку и подхватить новые файлы" },
     { keys: ["file name without extension", "without expansion"], icon: "📛", label: "without expansion / без расширения", desc: "Strip extensions (.png, .jpg) from the output filename text list", ru_desc: "🟢ON: Удалять расширения файлов в выходном текстовом списке | 🔴OFF: Оставить как есть" },
     { keys: ["seed"], icon: "🎲", label: "seed / сид перезапуска", desc: "Changes node state execution to force image list reloading and recalculation.", ru_desc: "Сид для обновления состояния работы узла и принудительного перезапуска чтения списка изображений." },
-    { keys: ["control before generate", "control after generate"], icon: "🔄", label: "behavior of the seed / поведение сида", desc: "Determines the behavior of the seed before generation. (Do not select the fixed mode!)", ru_desc: "Определяет поведение сида перед генерацией. (Не выбирать режим fixed!)" }
+    { keys: ["control before generate", "control after generate"], icon: "🔄", label: "behavior of the seed / поведение сида", desc: "Determines the behavior of the seed before generation. (Do not select the fixed mode!)", ru_desc: "Определяет поведение сида перед генерацией. (Не выбирать режим fixed!)" },
+    { keys: ["max side"], icon: "📐", label: "max side / макс. сторона", desc: "Downscale while decoding so the longer side fits (JPEG decodes directly at 1/2..1/8 scale); 0 - original size", ru_desc: "Уменьшать уже при декодировании, чтобы длинная сторона не превышала значение (JPEG сразу декодируется в масштабе 1/2..1/8); 0 - исходный размер" },
+    { keys: ["max megapixels"], icon: "🧮", label: "max megapixels / макс. мегапикселей", desc: "Downscale while decoding to at most this many megapixels; 0 - no limit", ru_desc: "Уменьшать уже при декодировании до указанного числа мегапикселей; 0 - без ограничения" }
 ];
 
 app.registerExtension({
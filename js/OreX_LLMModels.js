@@ -0,0 +1,60 @@
+import { app } from "../../../scripts/app.js";
+import { api } from "../../../scripts/api.js";
+
+// Кнопка обновления списков моделей и пресетов LLM нод без перезагрузки страницы и без ожидания в /object_info
+const DEFAULT_LLM = "SELECT A MODEL";
+
+function getBackend(nodeName) {
+    const name = (nodeName || "").toLowerCase();
+    if (name.includes("lmstudio")) return "lmstudio";
+    if (name.includes("ollama")) return "ollama";
+    return null;
+}
+
+app.registerExtension({
+    name: "OreX.LLMModels",
+    async beforeRegisterNodeDef(nodeType, nodeData) {
+        const backend = getBackend(nodeData.name);
+        if (!backend) return;
+
+        const onNodeCreated = nodeType.prototype.onNodeCreated;
+        nodeType.prototype.onNodeCreated = function () {
+            const r = onNodeCreated ? onNodeCreated.apply(this, arguments) : undefined;
+
+            this.addWidget("button", "🔄 Refresh models & presets", null, async () => {
+                const modelWidget = this.widgets?.find(w => w.name === "model_key");
+                if (!modelWidget) return;
+                try {
+                    const resp = await api.fetchApi(`/orex/llm_models/refresh?backend=${backend}`, { method: "POST" });
+                    const data = await resp.json();
+                    const models = (data.models || []).filter(m => m !== DEFAULT_LLM);
+                    modelWidget.options.values = [DEFAULT_LLM, ...models];
+                    // Пустой список = сервер недоступен: выбранную модель не сбрасываем
+                    if (models.length && !modelWidget.options.values.includes(modelWidget.value)) {
+                        modelWidget.value = DEFAULT_LLM;
+                    }
+                    this.setDirtyCanvas(true, true);
+                } catch (err) {
+                    console.error("[OreX] Could not refresh LLM models:", err);
+                }
+
+                // Пресеты перечитываются сервером при изменении JSON — подтягиваем актуальный список
+                const presetWidget = this.widgets?.find(w => w.name === "system_preset");
+                if (!presetWidget) return;
+                try {
+                    const resp = await api.fetchApi("/orex/llm_presets");
+                    const data = await resp.json();
+                    if (data.names?.length) {
+                        presetWidget.options.values = data.names;
+                        if (!data.names.includes(presetWidget.value)) presetWidget.value = data.names[0];
+                        this.setDirtyCanvas(true, true);
+                    }
+                } catch (err) {
+                    console.error("[OreX] Could not refresh LLM presets:", err);
+                }
+            }, { serialize: false });
+
+            return r;
+        };
+    }
+});
@@ -0,0 +1,43 @@
+import { app } from "../../../scripts/app.js";
+import { api } from "../../../scripts/api.js";
+
+// Показ частичного ответа LLM нод (LMStudio / Ollama) во время потоковой генерации
+const STREAM_EVENT = "orex-llm-stream";
+const STREAM_WIDGET = "stream_preview";
+
+function getStreamWidget(node) {
+    let widget = node.widgets?.find(w => w.name === STREAM_WIDGET);
+    if (widget) return widget;
+
+    const textarea = document.createElement("textarea");
+    textarea.readOnly = true;
+    textarea.style.width = "100%";
+    textarea.style.height = "120px";
+    textarea.style.resize = "none";
+    textarea.style.fontSize = "11px";
+    textarea.style.background = "rgba(18, 18, 18, 0.9)";
+    textarea.style.color = "#cccccc";
+    textarea.style.border = "1px solid rgba(0, 255, 70, 0.3)";
+
+    widget = node.addDOMWidget(STREAM_WIDGET, "div", textarea, { serialize: false, hideOnZoom: false });
+    widget.textarea = textarea;
+    node.setSize([node.size[0], node.computeSize()[1]]);
+    return widget;
+}
+
+app.registerExtension({
+    name: "OreX.LLMStream",
+    async setup() {
+        api.addEventListener(STREAM_EVENT, (e) => {
+            const data = e.detail;
+            const node = app.graph.getNodeById(data.node);
+            if (!node) return;
+
+            const widget = getStreamWidget(node);
+            widget.textarea.value = data.text || "";
+            widget.textarea.scrollTop = widget.textarea.scrollHeight;
+            widget.textarea.style.borderColor = data.done ? "rgba(0, 255, 70, 0.3)" : "rgba(255, 200, 0, 0.6)";
+            node.setDirtyCanvas(true, true);
+        });
+    }
+});
@@ -7,7 +7,7 @@ const LMSTUDIO_HELP_DESCRIPTIONS = [
     { icon: "🤖", name: "model_key", label: "Model Key / Выбор модели", desc: "Select the specific LM Studio model loaded in the server", ru_desc: "Выбор конкретной запущенной модели в интерфейсе LM Studio" },
     { icon: "🧠", name: "include_reasoning", label: "Include Reasoning / Мышление модели", desc: "🟢ON - enable the display of the reasoning chain (show tags <think>); 🔴OFF - disable the display of the reasoning chain (hide tags <think>)", ru_desc: "🟢ON - включение вывода цепочки рассуждений (показывать теги <think>); 🔴OFF -  отключение вывода цепочки рассуждений (скрывать теги <think>)" },
     { icon: "🔌", name: "auto_unload_model", label: "Auto Unload Model / Автовыгрузка модели", desc: "🟢ON - Automatically unloading the model after generation to free up VRAM", ru_desc: "🟢ON - Автоматически выгружать модель после генерации для освобождения VRAM" },
-    { icon: "⏳", name: "unload_delay", label: "Unload Delay / Задержка выгрузки", desc: "Time in seconds to wait before unloading the model", ru_desc: "Время в секундах перед выгрузкой модели" },
+    { icon: "⏳", name: "unload_delay", label: "Unload Delay / Задержка выгрузки", desc: "Idle seconds before unloading the model. The model stays loaded while queued prompts still use it", ru_desc: "Секунды простоя перед выгрузкой модели. Пока задания в очереди используют модель, она не выгружается" },
     { icon: "🧹", name: "clean_vram_before", label: "Clean VRAM / Очистка VRAM", desc: "🟢ON - Unload all ComfyUI models from VRAM before calling LM Studio", ru_desc: "🟢ON - Выгрузить все модели ComfyUI из VRAM перед вызовом LM Studio" },
     { icon: "🎲", name: "seed", label: "Seed / Сид", desc: "Randomness control for generations", ru_desc: "Контроль случайности для воспроизводимости ответа" },
     { icon: "🔄", name: "control_before_generate", label: "Control Before Generate / Поведение сида", desc: "Behavior of the seed before generation (random, incremental, fix)", ru_desc: "Поведение сида перед генерацией (рандом, инкремент, фиксировать)" },
@@ -17,7 +17,17 @@ const LMSTUDIO_HELP_DESCRIPTIONS = [
     { icon: "🔥", name: "temperature", label: "Temperature / Температура", desc: "Creativity slider. Higher values mean more random and creative output", ru_desc: "Ползунок креативности. Выше значение — более случайный и творческий ответ" },
     { icon: "📊", name: "top_k", label: "Top K", desc: "Limits pool of top tokens to choose from", ru_desc: "Ограничение выборки только из K самых вероятных токенов" },
     { icon: "🎯", name: "top_p", label: "Top P", desc: "Nucleus sampling threshold based on cumulative probability", ru_desc: "Порог выборки по кумулятивной вероятности токенов (ядерное семплирование)" },
-    { icon: "🚫", name: "repeat_penalty", label: "Repeat Penalty / Штраф за повторы", desc: "Prevents the model from repeating the same phrases or looping", ru_desc: "Предотвращает зацикливание и повторение одинаковых фраз" }
+    { icon: "🚫", name: "repeat_penalty", label: "Repeat Penalty / Штраф за повторы", desc: "Prevents the model from repeating the same phrases or looping", ru_desc: "Предотвращает зацикливание и повторение одинаковых фраз" },
+    { icon: "📡", name: "stream_output", label: "Stream Output / Потоковый вывод", desc: "🟢ON - Show the answer in the node while it is being generated; Cancel stops the request early", ru_desc: "🟢ON - Показывать ответ в ноде по мере генерации; кнопка Cancel сразу обрывает запрос" },
+    { icon: "🗄️", name: "use_cache", label: "Use Cache / Кэш ответов", desc: "🟢ON - Return the saved answer instantly for an identical request (model, prompts, parameters, image)", ru_desc: "🟢ON - Мгновенно возвращать сохранённый ответ на идентичный запрос (модель, промпты, параметры, изображение)" },
+    { icon: "🎞️", name: "batch_mode", label: "Batch Mode / Пакетный режим", desc: "🟢ON - Caption every frame of the IMAGE batch; texts are returned in frame order", ru_desc: "🟢ON - Обработать каждый кадр IMAGE-батча; тексты возвращаются в порядке кадров" },
+    { icon: "🔀", name: "parallel_requests", label: "Parallel Requests / Параллельные запросы", desc: "How many batch frames are sent to the server at the same time", ru_desc: "Сколько кадров батча отправляется на сервер одновременно" },
+    { icon: "🖼️", name: "target_megapixels", label: "Target Megapixels / Размер изображения", desc: "Image is downscaled to this many megapixels before it is sent to the model", ru_desc: "Изображение уменьшается до этого числа мегапикселей перед отправкой в модель" },
+    { icon: "🗜️", name: "jpeg_quality", label: "JPEG Quality / Качество JPEG", desc: "JPEG quality of the image sent to the model", ru_desc: "Качество JPEG изображения, отправляемого в модель" },
+    { icon: "🧾", name: "structured_output", label: "Structured Output / Структурированный вывод", desc: "🟢ON - The model answers with JSON constrained by json_schema; fields go to the JSON and Field 1-4 outputs", ru_desc: "🟢ON - Модель отвечает JSON по схеме json_schema; поля выводятся на выходы JSON и Field 1-4" },
+    { icon: "📐", name: "json_schema", label: "JSON Schema / Схема JSON", desc: "Full JSON Schema, or field names separated by commas (name[] = list of strings, e.g. caption, tags[])", ru_desc: "Полная JSON Schema или имена полей через запятую (имя[] = список строк, например caption, tags[])" },
+    { icon: "🧩", name: "tiling_mode", label: "Tiling Mode / Режим плиток", desc: "Large images: off - one downscaled image; single request - overview plus overlapping high-resolution crops in one request; parallel merge - one request per crop, answers merged", ru_desc: "Крупные изображения: off - одно уменьшенное изображение; single request - обзор и перекрывающиеся плитки в высоком разрешении одним запросом; parallel merge - отдельный запрос на плитку, ответы объединяются" },
+    { icon: "💰", name: "tile_budget_megapixels", label: "Tile Budget / Бюджет плиток", desc: "Total megapixels sent per image in tiling mode (overview included); each crop is at most Target Megapixels", ru_desc: "Сколько мегапикселей всего отправляется на изображение в режиме плиток (вместе с обзором); каждая плитка не больше Target Megapixels" }
 ];
 
 app.registerExtension({